@@ -5,31 +5,16 @@ from .deepseek_provider import DeepSeekProvider
 from .qwen_provider import QwenProvider
 from .grok_provider import GrokProvider
 from .claude_provider import ClaudeProvider
+from .registry import provider_registry
+from .executor import ai_executor, AIError
 import os
 
 async def get_ai_provider(model=None):
-    """获取AI提供者实例"""
+    """获取AI提供者实例，同一提供者的实例和连接在所有消息之间复用"""
     if not model:
         model = os.getenv('DEFAULT_AI_MODEL', 'gemini-2.0-flash')
 
-    # 根据模型名称选择对应的提供者
-    provider = None
-    if any(model.startswith(prefix) for prefix in ('gpt-', 'o1', 'o3', 'chatgpt')):
-        provider = OpenAIProvider()
-    elif model.startswith('gemini-'):
-        provider = GeminiProvider()
-    elif model.startswith('deepseek-'):
-        provider = DeepSeekProvider()
-    elif model.startswith('qwen-'):
-        provider = QwenProvider()
-    elif model.startswith('grok-'):
-        provider = GrokProvider()
-    elif model.startswith('claude-'):
-        provider = ClaudeProvider()
-    else:
-        raise ValueError(f"不支持的模型: {model}")
-
-    return provider
+    return provider_registry.get_provider(model)
 
 
 __all__ = [
@@ -40,5 +25,8 @@ __all__ = [
     'QwenProvider',
     'GrokProvider',
     'ClaudeProvider',
-    'get_ai_provider'
+    'get_ai_provider',
+    'provider_registry',
+    'ai_executor',
+    'AIError'
 ]
\ No newline at end of file
@@ -19,6 +19,9 @@ class BaseAIProvider(ABC):
             
         Returns:
             str: 处理后的消息
+            
+        Raises:
+            Exception: 调用失败或超时
         """
         pass
     
@@ -1,6 +1,9 @@
 from typing import Optional
 import anthropic
 from .base import BaseAIProvider
+from .http_pool import create_http_client
+from utils.constants import AI_TIMEOUT
+import asyncio
 import os
 import logging
 
@@ -9,40 +12,41 @@ logger = logging.getLogger(__name__)
 class ClaudeProvider(BaseAIProvider):
     def __init__(self):
         self.client = None
-        self.model = None
         self.default_model = 'claude-3-5-sonnet-latest'
         
     async def initialize(self, **kwargs):
-        """初始化Claude客户端"""
+        """初始化Claude客户端，客户端在所有模型和消息之间共享"""
+        if self.client:
+            return
         api_key = os.getenv('CLAUDE_API_KEY')
         if not api_key:
             raise ValueError("未设置CLAUDE_API_KEY环境变量")
             
-        self.client = anthropic.Anthropic(api_key=api_key)
-        self.model = kwargs.get('model', self.default_model)
+        self.client = anthropic.AsyncAnthropic(
+            api_key=api_key,
+            timeout=AI_TIMEOUT,
+            # 重试由 AI 执行层统一处理
+            max_retries=0,
+            http_client=create_http_client(anthropic.DefaultAsyncHttpxClient)
+        )
         
     async def process_message(self, 
                             message: str, 
                             prompt: Optional[str] = None,
                             **kwargs) -> str:
-        """处理消息"""
-        try:
-            if not self.client:
-                await self.initialize(**kwargs)
-                
-            messages = []
-            if prompt:
-                messages.append({"role": "system", "content": prompt})
-            messages.append({"role": "user", "content": message})
+        """处理消息，调用失败时抛出异常"""
+        if not self.client:
+            await self.initialize(**kwargs)
             
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                messages=messages
-            )
-            
-            return response.content[0].text
-            
-        except Exception as e:
-            logger.error(f"Claude API 调用失败: {str(e)}")
-            return f"AI处理失败: {str(e)}" 
\ No newline at end of file
+        # Claude 的系统提示词通过 system 参数传入，不能作为消息
+        request = {
+            "model": kwargs.get('model') or self.default_model,
+            "max_tokens": 4096,
+            "messages": [{"role": "user", "content": message}]
+        }
+        if prompt:
+            request["system"] = prompt
+        
+        response = await asyncio.wait_for(self.client.messages.create(**request), AI_TIMEOUT)
+        
+        return response.content[0].text
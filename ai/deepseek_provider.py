@@ -1,5 +1,4 @@
 from typing import Optional
-from openai import OpenAI
 from .openai_base_provider import OpenAIBaseProvider
 import os
 import logging
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+
+import anthropic
+import httpx
+import openai
+
+from .registry import provider_registry
+from utils.constants import (
+    AI_MAX_CONCURRENCY, AI_RPM, AI_TPM, AI_MAX_RETRIES, AI_DEADLINE,
+    AI_BREAKER_THRESHOLD, AI_BREAKER_COOLDOWN, AI_METRICS_INTERVAL
+)
+from utils.token_bucket import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# 重试的基础等待时间和最长等待时间（秒）
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+# 每个模型保留的延迟样本数
+MAX_LATENCY_SAMPLES = 200
+
+
+class AIError(Exception):
+    """AI处理失败"""
+
+
+class CircuitOpenError(AIError):
+    """模型连续失败，熔断器处于打开状态"""
+
+
+class DeadlineExceededError(AIError):
+    """超过了AI处理的截止时间"""
+
+
+def get_status_code(error):
+    """获取错误对应的 HTTP 状态码，没有时返回 None"""
+    status = getattr(error, 'status_code', None)
+    if isinstance(status, int):
+        return status
+    # google.api_core 的异常以 code 表示 HTTP 状态码
+    code = getattr(error, 'code', None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(error):
+    """限流（429）、服务端错误（5xx）、超时和连接错误可以重试"""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    status = get_status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (openai.APIConnectionError, anthropic.APIConnectionError, httpx.TransportError))
+
+
+def get_retry_after(error):
+    """获取服务端要求的重试等待时间（秒），没有时返回 0"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return 0
+    try:
+        return max(float(headers.get('retry-after', 0)), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def estimate_tokens(*texts):
+    """粗略估计文本的 token 数（按 UTF-8 字节数的四分之一计算）"""
+    return sum(len(text.encode('utf-8')) for text in texts if text) // 4 + 1
+
+
+def _get_limit(env_prefix, name, default):
+    value = os.getenv(f'{env_prefix}_{name}', '').strip()
+    return float(value) if value else default
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败 threshold 次后打开，cooldown 秒内的调用直接失败。
+    冷却结束后放行一次试探调用，成功则关闭，失败则再次打开
+    """
+
+    __slots__ = ('threshold', 'cooldown', 'failures', 'opened_at')
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """是否允许调用"""
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at < self.cooldown:
+            return False
+        # 放行一次试探调用，结果返回前其他调用继续等待下一次冷却结束
+        self.opened_at = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.threshold > 0 and (self.opened_at is not None or self.failures >= self.threshold):
+            self.opened_at = time.monotonic()
+
+
+class _ProviderLimiter:
+    """一个提供者的并发和速率限制"""
+
+    __slots__ = ('semaphore', 'rpm', 'tpm')
+
+    def __init__(self, concurrency, rpm, tpm):
+        self.semaphore = asyncio.Semaphore(max(int(concurrency), 1))
+        self.rpm = TokenBucket(rpm / 60, rpm)
+        self.tpm = TokenBucket(tpm / 60, tpm)
+
+
+class _ModelStats:
+    """一个模型的调用统计"""
+
+    __slots__ = ('requests', 'errors', 'retries', 'fallbacks', 'latencies')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.fallbacks = 0
+        self.latencies = deque(maxlen=MAX_LATENCY_SAMPLES)
+
+
+class AIExecutor:
+    """
+    AI执行层
+
+    所有AI调用经过执行层：每个提供者有并发数限制和每分钟请求数、token 数的令牌桶限速，
+    遇到 429、5xx、超时和连接错误时按带随机抖动的指数退避重试，同一模型连续失败后
+    熔断器打开，冷却期间的调用直接失败。主模型失败（包括熔断和超过截止时间）时使用
+    规则配置的备用模型。每个模型的延迟和错误次数定期输出到日志。
+
+    提供者的限制可以通过 {提供者}_MAX_CONCURRENCY、{提供者}_RPM、{提供者}_TPM
+    环境变量单独设置（例如 OPENAI_RPM），未设置时使用 AI_ 开头的全局设置
+    """
+
+    def __init__(self, max_retries=AI_MAX_RETRIES, deadline=AI_DEADLINE, breaker_threshold=AI_BREAKER_THRESHOLD,
+                 breaker_cooldown=AI_BREAKER_COOLDOWN, metrics_interval=AI_METRICS_INTERVAL):
+        self._max_retries = max_retries
+        self._deadline = deadline
+        self._breaker_threshold = breaker_threshold
+        self._breaker_cooldown = breaker_cooldown
+        self._metrics_interval = metrics_interval
+        # 提供者名称 -> 并发和速率限制
+        self._limiters = {}
+        # 模型名称 -> 熔断器
+        self._breakers = {}
+        # 模型名称 -> 调用统计
+        self._stats = {}
+        self._report_task = None
+
+    def _get_limiter(self, provider_name):
+        limiter = self._limiters.get(provider_name)
+        if limiter is None:
+            env_prefix = provider_name.upper()
+            limiter = self._limiters[provider_name] = _ProviderLimiter(
+                _get_limit(env_prefix, 'MAX_CONCURRENCY', AI_MAX_CONCURRENCY),
+                _get_limit(env_prefix, 'RPM', AI_RPM),
+                _get_limit(env_prefix, 'TPM', AI_TPM)
+            )
+        return limiter
+
+    def _get_breaker(self, model):
+        breaker = self._breakers.get(model)
+        if breaker is None:
+            breaker = self._breakers[model] = CircuitBreaker(self._breaker_threshold, self._breaker_cooldown)
+        return breaker
+
+    def _get_stats(self, model):
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = _ModelStats()
+        return stats
+
+    async def process_message(self, model, message, prompt=None, fallback_model=None):
+        """
+        使用AI处理消息
+
+        Args:
+            model: 模型名称
+            message: 消息内容
+            prompt: 提示词
+            fallback_model: 主模型失败时使用的备用模型
+
+        Returns:
+            str: 处理结果
+
+        Raises:
+            AIError: 主模型和备用模型都处理失败
+        """
+        self._ensure_reporter()
+        # 主模型和备用模型共用同一个截止时间，备用模型只能使用剩余的时间
+        deadline = asyncio.get_running_loop().time() + self._deadline
+        try:
+            return await self._execute(model, message, prompt, deadline)
+        except AIError as e:
+            if not fallback_model or fallback_model == model:
+                raise
+            self._get_stats(model).fallbacks += 1
+            logger.warning(f'{e}，使用备用模型 {fallback_model}')
+            return await self._execute(fallback_model, message, prompt, deadline)
+
+    async def _execute(self, model, message, prompt, deadline):
+        try:
+            provider_name = provider_registry.resolve(model)
+            provider = provider_registry.get_provider(model)
+        except ValueError as e:
+            raise AIError(str(e)) from e
+
+        limiter = self._get_limiter(provider_name)
+        breaker = self._get_breaker(model)
+        stats = self._get_stats(model)
+        tokens = estimate_tokens(prompt, message)
+        loop = asyncio.get_running_loop()
+        attempt = 0
+
+        while True:
+            if loop.time() >= deadline:
+                raise DeadlineExceededError(f'模型 {model} 在 {self._deadline} 秒的截止时间内没有剩余时间')
+            if not breaker.allow():
+                raise CircuitOpenError(f'模型 {model} 连续失败，熔断中')
+
+            started = loop.time()
+            stats.requests += 1
+            try:
+                # 等待并发和速率限制的时间同样计入截止时间
+                result = await asyncio.wait_for(
+                    self._call(limiter, provider, model, message, prompt, tokens),
+                    deadline - started
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                stats.errors += 1
+                if loop.time() >= deadline:
+                    raise DeadlineExceededError(f'模型 {model} 超过 {self._deadline} 秒仍未完成') from e
+
+                retryable = is_retryable(e)
+                if retryable:
+                    breaker.record_failure()
+                if not retryable or attempt >= self._max_retries:
+                    raise AIError(f'模型 {model} 调用失败: {type(e).__name__}: {e}') from e
+
+                delay = max(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)), get_retry_after(e))
+                if loop.time() + delay >= deadline:
+                    raise DeadlineExceededError(f'模型 {model} 在截止时间前无法完成重试') from e
+                attempt += 1
+                stats.retries += 1
+                logger.warning(f'模型 {model} 调用失败: {type(e).__name__}: {e}，{delay:.1f} 秒后第 {attempt} 次重试')
+                await asyncio.sleep(delay)
+                continue
+
+            breaker.record_success()
+            stats.latencies.append(loop.time() - started)
+            return result
+
+    async def _call(self, limiter, provider, model, message, prompt, tokens):
+        async with limiter.semaphore:
+            await limiter.rpm.acquire()
+            await limiter.tpm.acquire(tokens)
+            return await provider.process_message(message=message, prompt=prompt, model=model)
+
+    def metrics(self):
+        """获取每个模型的调用统计"""
+        result = []
+        for model, stats in self._stats.items():
+            latencies = sorted(stats.latencies)
+            breaker = self._breakers.get(model)
+            result.append({
+                'model': model,
+                'requests': stats.requests,
+                'errors': stats.errors,
+                'retries': stats.retries,
+                'fallbacks': stats.fallbacks,
+                'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+                'p95_latency': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0,
+                'circuit_open': bool(breaker and breaker.is_open),
+            })
+        return result
+
+    def _ensure_reporter(self):
+        if self._metrics_interval > 0 and (self._report_task is None or self._report_task.done()):
+            self._report_task = asyncio.create_task(self._report_metrics())
+
+    async def _report_metrics(self):
+        last_requests = {}
+        while True:
+            await asyncio.sleep(self._metrics_interval)
+            for metrics in self.metrics():
+                if last_requests.get(metrics['model']) == metrics['requests']:
+                    continue
+                last_requests[metrics['model']] = metrics['requests']
+                logger.info(
+                    f"AI模型 {metrics['model']}: 请求 {metrics['requests']} 次, 错误 {metrics['errors']} 次, "
+                    f"重试 {metrics['retries']} 次, 使用备用模型 {metrics['fallbacks']} 次, "
+                    f"平均延迟 {metrics['avg_latency']:.2f}s, P95 延迟 {metrics['p95_latency']:.2f}s"
+                    f"{', 熔断中' if metrics['circuit_open'] else ''}"
+                )
+
+
+# 创建全局实例
+ai_executor = AIExecutor()
@@ -0,0 +1,33 @@
+import importlib.util
+import logging
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 安装了 h2 时使用 HTTP/2，同一个连接上可以并发多个请求
+HTTP2_ENABLED = importlib.util.find_spec('h2') is not None
+
+# 每个客户端保持的空闲连接数和空闲连接的保持时间（秒）
+MAX_KEEPALIVE_CONNECTIONS = 20
+KEEPALIVE_EXPIRY = 120
+
+
+def create_http_client(client_class):
+    """
+    创建复用连接的 HTTP 客户端
+
+    Args:
+        client_class: SDK 提供的默认 httpx 异步客户端类，保留 SDK 的默认超时和重定向设置
+
+    Returns:
+        httpx.AsyncClient: 开启连接保持（以及可用时开启 HTTP/2）的客户端
+    """
+    return client_class(
+        http2=HTTP2_ENABLED,
+        limits=httpx.Limits(
+            max_connections=None,
+            max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=KEEPALIVE_EXPIRY
+        )
+    )
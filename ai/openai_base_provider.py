@@ -1,6 +1,9 @@
 from typing import Optional
-from openai import OpenAI
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
 from .base import BaseAIProvider
+from .http_pool import create_http_client
+from utils.constants import AI_TIMEOUT
+import asyncio
 import os
 import logging
 
@@ -17,7 +20,6 @@ class OpenAIBaseProvider(BaseAIProvider):
             default_api_base: 默认API基础URL
         """
         self.client = None
-        self.model = None
         self.env_prefix = env_prefix
         self.default_model = default_model
         
@@ -26,43 +28,47 @@ class OpenAIBaseProvider(BaseAIProvider):
         self.api_base = api_base if api_base else default_api_base
     
     async def initialize(self, **kwargs):
-        """初始化OpenAI客户端"""
+        """初始化OpenAI客户端，客户端在所有模型和消息之间共享"""
+        if self.client:
+            return
         api_key = os.getenv(f'{self.env_prefix}_API_KEY')
         if not api_key:
             raise ValueError(f"未设置{self.env_prefix}_API_KEY环境变量")
             
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             api_key=api_key,
-            base_url=self.api_base
+            base_url=self.api_base,
+            timeout=AI_TIMEOUT,
+            # 重试由 AI 执行层统一处理
+            max_retries=0,
+            http_client=create_http_client(DefaultAsyncHttpxClient)
         )
-        logger.info(f"初始化OpenAI模型: {kwargs.get('model')}")
-        
-        self.model = kwargs.get('model', self.default_model)
+        logger.info(f"初始化{self.env_prefix}客户端: {self.api_base}")
         
     async def process_message(self, 
                             message: str, 
                             prompt: Optional[str] = None,
                             **kwargs) -> str:
-        """处理消息"""
-        try:
-            if not self.client:
-                await self.initialize(**kwargs)
-                
-            messages = []
-            if prompt:
-                messages.append({"role": "system", "content": prompt})
-            messages.append({"role": "user", "content": message})
-
-            logger.info(f"实际使用的OpenAI模型: {self.model}")
+        """处理消息，调用失败时抛出异常"""
+        if not self.client:
+            await self.initialize(**kwargs)
             
-            completion = self.client.chat.completions.create(
-                model=self.model,
+        model = kwargs.get('model') or self.default_model
+        messages = []
+        if prompt:
+            messages.append({"role": "system", "content": prompt})
+        messages.append({"role": "user", "content": message})
+
+        logger.info(f"实际使用的OpenAI模型: {model}")
+        
+        # 超时后取消请求
+        completion = await asyncio.wait_for(
+            self.client.chat.completions.create(
+                model=model,
                 messages=messages,
                 stream=False
-            )
-            
-            return completion.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"{self.env_prefix} API 调用失败: {str(e)}")
-            return f"AI处理失败: {str(e)}" 
\ No newline at end of file
+            ),
+            AI_TIMEOUT
+        )
+        
+        return completion.choices[0].message.content
@@ -0,0 +1,133 @@
+import logging
+import os
+import time
+
+from .openai_provider import OpenAIProvider
+from .gemini_provider import GeminiProvider
+from .deepseek_provider import DeepSeekProvider
+from .qwen_provider import QwenProvider
+from .grok_provider import GrokProvider
+from .claude_provider import ClaudeProvider
+from utils.constants import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# 提供者名称 -> 提供者类，名称的大写形式同时是环境变量前缀
+PROVIDERS = {
+    'openai': OpenAIProvider,
+    'gemini': GeminiProvider,
+    'deepseek': DeepSeekProvider,
+    'qwen': QwenProvider,
+    'grok': GrokProvider,
+    'claude': ClaudeProvider,
+}
+
+# 模型名称前缀 -> 提供者名称
+MODEL_PREFIXES = (
+    (('gpt-', 'o1', 'o3', 'chatgpt'), 'openai'),
+    (('gemini-',), 'gemini'),
+    (('deepseek-',), 'deepseek'),
+    (('qwen-',), 'qwen'),
+    (('grok-',), 'grok'),
+    (('claude-',), 'claude'),
+)
+
+AI_MODELS_PATH = os.path.join(BASE_DIR, 'config', 'ai_models.txt')
+# 检查 ai_models.txt 是否修改的间隔（秒）
+RELOAD_INTERVAL = 5
+
+
+def match_prefix(model):
+    """根据模型名称前缀获取提供者名称，没有匹配时返回 None"""
+    for prefixes, name in MODEL_PREFIXES:
+        if model.startswith(prefixes):
+            return name
+    return None
+
+
+class ProviderRegistry:
+    """
+    AI提供者注册表
+
+    每个 (提供者, API地址, API Key) 只创建一个提供者实例，实例中的 SDK 客户端
+    保持连接，在所有消息之间复用。模型到提供者的映射在读取 ai_models.txt 时
+    一次性解析，文件修改后自动重新加载。ai_models.txt 的每一行可以在模型名称后
+    写上提供者名称（例如 `llama-3.3-70b openai`），用于名称前缀无法识别的模型
+    """
+
+    def __init__(self, models_path=AI_MODELS_PATH, reload_interval=RELOAD_INTERVAL):
+        self._models_path = models_path
+        self._reload_interval = reload_interval
+        # (提供者名称, API地址, API Key) -> 提供者实例
+        self._providers = {}
+        # 模型名称 -> 提供者名称
+        self._model_providers = {}
+        self._models = []
+        self._mtime = None
+        self._checked_at = 0
+
+    def _reload_if_changed(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._checked_at < self._reload_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self._models_path).st_mtime
+        except OSError:
+            mtime = 0
+        if mtime == self._mtime:
+            return
+        self._mtime = mtime
+        self._load()
+
+    def _load(self):
+        models = []
+        model_providers = {}
+        try:
+            with open(self._models_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if not parts:
+                        continue
+                    model = parts[0]
+                    name = parts[1].lower() if len(parts) > 1 else match_prefix(model)
+                    if name not in PROVIDERS:
+                        logger.warning(f"ai_models.txt 中的模型 {model} 没有对应的提供者，已忽略")
+                        continue
+                    models.append(model)
+                    model_providers[model] = name
+        except (FileNotFoundError, IOError) as e:
+            logger.warning(f"ai_models.txt 加载失败: {e}，按模型名称前缀选择提供者")
+        self._models = models
+        self._model_providers = model_providers
+        logger.info(f"已加载 {len(models)} 个AI模型")
+
+    def get_models(self):
+        """获取 ai_models.txt 中的模型列表"""
+        self._reload_if_changed()
+        return list(self._models)
+
+    def resolve(self, model):
+        """获取模型对应的提供者名称"""
+        self._reload_if_changed()
+        name = self._model_providers.get(model)
+        if name is None:
+            name = match_prefix(model)
+            if name is None:
+                raise ValueError(f"不支持的模型: {model}")
+            self._model_providers[model] = name
+        return name
+
+    def get_provider(self, model):
+        """获取模型对应的提供者实例，相同连接参数的模型共享同一个实例"""
+        name = self.resolve(model)
+        env_prefix = name.upper()
+        key = (name, os.getenv(f'{env_prefix}_API_BASE', '').strip(), os.getenv(f'{env_prefix}_API_KEY'))
+        provider = self._providers.get(key)
+        if provider is None:
+            provider = self._providers[key] = PROVIDERS[name]()
+        return provider
+
+
+# 创建全局实例
+provider_registry = ProviderRegistry()
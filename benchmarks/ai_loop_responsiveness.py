@@ -0,0 +1,135 @@
+"""
+检查AI调用期间事件循环保持响应
+
+在本地启动一个延迟返回的 OpenAI 兼容接口，调用 OpenAIProvider 的同时运行一个
+每 50 毫秒唤醒一次的协程，记录两次唤醒之间的最大间隔。同步客户端会阻塞整个
+事件循环，间隔接近接口的延迟；异步客户端的间隔应接近 50 毫秒。
+同时检查超时和取消调用时请求会被中断
+
+用法：
+    python benchmarks/ai_loop_responsiveness.py
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 接口返回前的延迟（秒）
+STUB_DELAY = 2
+# 唤醒协程的间隔（秒），以及允许的最大唤醒间隔
+TICK_INTERVAL = 0.05
+MAX_TICK_GAP = 0.25
+
+
+class SlowCompletionHandler(BaseHTTPRequestHandler):
+    """延迟 STUB_DELAY 秒后返回固定结果的 chat.completions 接口"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(STUB_DELAY)
+        body = json.dumps({
+            'id': 'stub',
+            'object': 'chat.completion',
+            'created': 0,
+            'model': request['model'],
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': 'ok'}, 'finish_reason': 'stop'}],
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已取消请求
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+async def run_with_ticker(coro):
+    """运行 coro，同时记录唤醒协程的最大间隔"""
+    max_gap = 0.0
+
+    async def ticker():
+        nonlocal max_gap
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(TICK_INTERVAL)
+            now = time.monotonic()
+            max_gap = max(max_gap, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+    return result, max_gap
+
+
+async def main():
+    server = start_stub_server()
+    os.environ['OPENAI_API_KEY'] = 'stub'
+    os.environ['OPENAI_API_BASE'] = f'http://127.0.0.1:{server.server_port}/v1'
+
+    import ai.openai_base_provider as openai_base_provider
+    from ai.openai_provider import OpenAIProvider
+
+    provider = OpenAIProvider()
+    failures = []
+
+    # 1. 慢请求期间事件循环保持响应
+    started = time.monotonic()
+    result, max_gap = await run_with_ticker(provider.process_message('hello', prompt='echo', model='stub-model'))
+    elapsed = time.monotonic() - started
+    print(f'慢请求: 结果 {result!r}, 耗时 {elapsed:.2f}s, 最大唤醒间隔 {max_gap * 1000:.0f}ms')
+    if result != 'ok' or max_gap > MAX_TICK_GAP:
+        failures.append('慢请求期间事件循环被阻塞')
+
+    # 2. 取消调用者时请求随之取消
+    task = asyncio.create_task(provider.process_message('hello', model='stub-model'))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    started = time.monotonic()
+    try:
+        await task
+        failures.append('取消后请求仍然完成')
+    except asyncio.CancelledError:
+        print(f'取消: 请求在 {time.monotonic() - started:.3f}s 内结束')
+
+    # 3. 超过 AI_TIMEOUT 的请求被中断
+    openai_base_provider.AI_TIMEOUT = 0.5
+    started = time.monotonic()
+    try:
+        await provider.process_message('hello', model='stub-model')
+        failures.append('超时后请求仍然完成')
+    except asyncio.TimeoutError:
+        elapsed = time.monotonic() - started
+        print(f'超时: 请求在 {elapsed:.2f}s 后中断')
+        if elapsed > 1:
+            failures.append('超时没有及时中断请求')
+
+    server.shutdown()
+    if failures:
+        print('失败: ' + '; '.join(failures))
+        sys.exit(1)
+    print('通过')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+MessageContext 复制开销对比：copy.deepcopy 与 MessageContext.clone()
+
+Telethon 的 NewMessage 事件无法被深拷贝（Event.__getattr__ 会无限递归），
+因此 deepcopy 的基准把事件替换为其中的消息对象，相当于旧实现能够复制的最好情况
+
+用法：
+    python benchmarks/context_copy.py [迭代次数]
+"""
+import asyncio
+import copy
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telethon import events
+from telethon.tl.types import Message, PeerChannel
+
+from filters.context import MessageContext
+
+
+def build_context():
+    """构建一个接近实际大小的上下文：约 240 字的消息文本，20 个关键字的规则"""
+    message = Message(
+        id=1000,
+        peer_id=PeerChannel(1234567890),
+        date=datetime.now(timezone.utc),
+        message='这是一条用于测试的频道消息，包含一些普通的文本内容。' * 10
+    )
+    event = events.NewMessage.Event(message)
+    rule = SimpleNamespace(
+        id=1,
+        keywords=[SimpleNamespace(keyword=f'关键字{i}', is_regex=False, is_blacklist=True) for i in range(20)],
+        replace_rules=[],
+    )
+    context = MessageContext(None, event, 1234567890, rule)
+    context.errors.append('示例错误')
+    return context
+
+
+def measure(name, copy_func, context, iterations):
+    copy_func(context)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        copy_func(context)
+    elapsed = (time.perf_counter() - start) / iterations
+
+    tracemalloc.start()
+    copy_func(context)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{name:<10} {elapsed * 1e6:8.1f} us/次  峰值内存 {peak / 1024:6.1f} KB')
+
+
+async def main(iterations):
+    context = build_context()
+
+    # deepcopy 的基准使用消息对象代替无法深拷贝的事件
+    baseline = build_context()
+    baseline.event = baseline.event.message
+
+    print(f'迭代次数: {iterations}')
+    measure('deepcopy', copy.deepcopy, baseline, iterations)
+    measure('clone()', MessageContext.clone, context, iterations)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
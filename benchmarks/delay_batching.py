@@ -0,0 +1,105 @@
+"""
+检查延迟处理的消息合并为一次 get_messages 请求
+
+通过转发分发器为同一源聊天的 N 条消息各执行一条延迟处理规则（目标聊天各不相同），
+N 大于 FORWARD_CONCURRENCY，等待中的规则不占用并发名额，应当全部进入延迟调度器，
+在同一时间点到期后由一次 get_messages 调用取回
+
+用法：
+    python benchmarks/delay_batching.py [消息数]
+"""
+import asyncio
+import math
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['DELAY_EDIT_TRACKING'] = 'false'
+
+from telethon import events
+from telethon.tl.types import Message, PeerChannel
+
+from filters.context import MessageContext
+from filters.delay_filter import DelayFilter
+from managers.delay_scheduler import delay_scheduler
+from managers.dispatch_manager import ForwardDispatcher
+from utils.constants import FORWARD_CONCURRENCY
+
+CHAT_ID = -1001234567890
+DELAY_SECONDS = 1
+
+
+class StubClient:
+    """记录每次 get_messages 调用的客户端"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def get_messages(self, chat_id, ids):
+        self.calls.append((chat_id, list(ids)))
+        await asyncio.sleep(0.05)
+        return [build_message(message_id, '已编辑') for message_id in ids]
+
+
+def build_message(message_id, text):
+    return Message(
+        id=message_id,
+        peer_id=PeerChannel(1234567890),
+        date=datetime.now(timezone.utc),
+        message=text
+    )
+
+
+async def process(client, event, rule, send_ticket=None):
+    context = MessageContext(client, event, CHAT_ID, rule, send_ticket)
+    await DelayFilter().process(context)
+    await send_ticket.wait_turn()
+    # 客户端为空时 Message.text 为 None，直接比较原始文本
+    return context.event.message.message
+
+
+async def main(count):
+    client = StubClient()
+    dispatcher = ForwardDispatcher()
+    loop = asyncio.get_running_loop()
+
+    # 从调度器的时间点开始后分发，所有请求落在同一个到期时间点
+    tick = delay_scheduler._tick or 0.1
+    await asyncio.sleep(math.ceil(loop.time() / tick) * tick - loop.time() + 0.01)
+
+    started = time.monotonic()
+    tasks = []
+    for i in range(count):
+        event = events.NewMessage.Event(build_message(1000 + i, '原始内容'))
+        rule = SimpleNamespace(
+            id=i,
+            enable_delay=True,
+            delay_seconds=DELAY_SECONDS,
+            target_chat=SimpleNamespace(telegram_chat_id=str(i))
+        )
+        tasks += await dispatcher.dispatch([(rule, process, (client, event, rule))])
+    dispatched = time.monotonic() - started
+    results = await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+
+    requested = sum(len(ids) for _, ids in client.calls)
+    print(f'消息数: {count}（并发上限 {FORWARD_CONCURRENCY}）')
+    print(f'分发耗时 {dispatched * 1000:.0f}ms，总耗时 {elapsed:.2f}s')
+    print(f'get_messages 调用 {len(client.calls)} 次，共获取 {requested} 条消息')
+
+    failures = []
+    if len(client.calls) != math.ceil(count / 100):
+        failures.append('延迟处理的消息没有合并为一次请求')
+    if any(result != '已编辑' for result in results):
+        failures.append('部分规则没有得到更新后的消息')
+    if failures:
+        print('失败: ' + '; '.join(failures))
+        sys.exit(1)
+    print('通过')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 50))
@@ -1,6 +1,7 @@
 import logging
 from handlers.message_handler import ai_handle
 from filters.base_filter import BaseFilter
+from utils.common import check_keywords
 
 logger = logging.getLogger(__name__)
 
@@ -23,7 +24,7 @@ class AIFilter(BaseFilter):
         message_text = context.message_text
         original_message_text = context.original_message_text
 
-        logger.info(f"AIFilter处理消息前，context: {context.__dict__}")
+        logger.info(f"AIFilter处理消息前，context: {context}")
         try:
             if not rule.is_ai:
                 logger.info("AI处理未开启，返回原始消息")
@@ -41,15 +42,8 @@ class AIFilter(BaseFilter):
                     
                     # 如果需要在AI处理后再次检查关键字
                     if rule.is_keyword_after_ai:
-                        from filters.keyword_filter import KeywordFilter
-                        # 创建一个临时关键字过滤器进行检查
-                        keyword_filter = KeywordFilter(name="AIPostKeywordFilter")
-                        # 创建一个克隆的上下文，避免修改原始上下文
-                        temp_context = context.clone()
-                        temp_context.check_message_text = processed_text
-                        
                         # 检查AI处理后的文本是否满足关键字条件
-                        should_forward = await keyword_filter._check_keywords(rule, processed_text)
+                        should_forward = await check_keywords(rule, processed_text)
                         
                         if not should_forward:
                             logger.info('AI处理后的文本未通过关键字检查，取消转发')
@@ -61,4 +55,4 @@ class AIFilter(BaseFilter):
                     # 即使AI处理失败，仍然继续处理
             return True 
         finally:
-            logger.info(f"AIFilter处理消息后，context: {context.__dict__}")
+            logger.info(f"AIFilter处理消息后，context: {context}")
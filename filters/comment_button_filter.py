@@ -6,6 +6,9 @@ import traceback
 from telethon import Button
 from filters.base_filter import BaseFilter
 from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.types import PeerChannel
+from telethon.utils import get_peer_id
+from managers.peer_cache import peer_cache
 from utils.common import get_main_module
 
 logger = logging.getLogger(__name__)
@@ -25,7 +28,7 @@ class CommentButtonFilter(BaseFilter):
         Returns:
             bool: 是否继续处理
         """
-        logger.info(f"CommentButtonFilter处理消息前，context: {context.__dict__}")
+        logger.info(f"CommentButtonFilter处理消息前，context: {context}")
         try:
             # 如果规则不存在或未启用评论按钮功能，直接跳过
             if not context.rule or not context.rule.enable_comment_button:
@@ -42,42 +45,44 @@ class CommentButtonFilter(BaseFilter):
                 
                 event = context.event
                 
-                # 获取原始频道实体
-                channel_entity = await client.get_entity(event.chat_id)
+                # 只处理频道消息，频道标记直接从消息的 peer 判断
+                if not isinstance(event.message.peer_id, PeerChannel):
+                    return True
+                
+                # 从聊天信息缓存获取频道信息
+                channel_info = await peer_cache.get_info(client, event.chat_id)
                 
                 # 获取频道的真实用户名
-                channel_username = None
-                if hasattr(channel_entity, 'username') and channel_entity.username:
-                    channel_username = channel_entity.username
+                channel_username = channel_info.username
+                if channel_username:
                     logger.info(f"获取到频道用户名: {channel_username}")
                 
-                # 获取频道ID（去除前缀）
-                channel_id_str = str(channel_entity.id)
-                if channel_id_str.startswith('-100'):
-                    channel_id_str = channel_id_str[4:]
-                elif channel_id_str.startswith('100'):
-                    channel_id_str = channel_id_str[3:]
+                # 获取频道ID（不带前缀）
+                channel_id_str = str(channel_info.id)
                     
                 logger.info(f"处理频道ID: {channel_id_str}")
                 
-                # 只处理频道消息
-                if not hasattr(channel_entity, 'broadcast') or not channel_entity.broadcast:
+                # 超级群组没有评论区
+                if not channel_info.is_broadcast:
                     return True
                     
                 # 获取关联群组ID
                 try:
                     # 获取频道完整信息
-                    full_channel = await client(GetFullChannelRequest(channel_entity))
+                    full_channel = await client(GetFullChannelRequest(event.chat_id))
+                    # 完整信息中附带了频道和关联群组的实体
+                    for chat in full_channel.chats:
+                        peer_cache.remember(chat)
                     
                     # 检查是否有关联群组
                     if not full_channel.full_chat.linked_chat_id:
-                        logger.info(f"频道 {channel_entity.id} 没有关联群组，跳过添加评论按钮")
+                        logger.info(f"频道 {channel_info.id} 没有关联群组，跳过添加评论按钮")
                         return True
                         
                     linked_group_id = full_channel.full_chat.linked_chat_id
                     
-                    # 获取关联群组实体
-                    linked_group = await client.get_entity(linked_group_id)
+                    # 获取关联群组信息
+                    linked_group = await peer_cache.get_info(client, get_peer_id(PeerChannel(linked_group_id)))
                     
                     # 获取频道消息ID
                     channel_msg_id = event.message.id
@@ -101,7 +106,7 @@ class CommentButtonFilter(BaseFilter):
                     try:
                         # 查找关联群组中对应的消息 - 使用用户客户端
                         logger.info(f"尝试使用用户客户端获取群组 {linked_group_id} 的消息")
-                        group_messages = await client.get_messages(linked_group, limit=5)
+                        group_messages = await client.get_messages(linked_group.peer_id, limit=5)
                         logger.info(f"成功获取关联群组 {linked_group_id} 的 {len(group_messages)} 条消息")
                         
                         # 尝试查找内容相同的消息
@@ -172,7 +177,7 @@ class CommentButtonFilter(BaseFilter):
                     
                     # 创建群组备用链接
                     group_link = None
-                    if hasattr(linked_group, 'username') and linked_group.username:
+                    if linked_group.username:
                         group_link = f"https://t.me/{linked_group.username}"
                         logger.info(f"生成群组备用链接: {group_link}")
                     
@@ -188,8 +193,8 @@ class CommentButtonFilter(BaseFilter):
                         if not context.buttons:
                             context.buttons = [[comment_button]]
                         else:
-                            # 如果已经有按钮，添加到第一行
-                            context.buttons.insert(0, [comment_button])
+                            # 如果已经有按钮，添加到第一行（按钮列表来自原消息，不能原地修改）
+                            context.buttons = [[comment_button]] + list(context.buttons)
                         
                         logger.info(f"为消息添加了评论区按钮，链接: {comment_link}")
                         buttons_added = True
@@ -209,4 +214,4 @@ class CommentButtonFilter(BaseFilter):
                 
             return True 
         finally:
-            logger.info(f"CommentButtonFilter处理消息后，context: {context.__dict__}")
+            logger.info(f"CommentButtonFilter处理消息后，context: {context}")
@@ -1,11 +1,21 @@
-import copy
+from managers.album_manager import album_aggregator
 
 class MessageContext:
     """
     消息上下文类，包含处理消息所需的所有信息
+
+    使用 __slots__ 保存字段，不创建实例字典
     """
     
-    def __init__(self, client, event, chat_id, rule):
+    __slots__ = (
+        'client', 'event', 'chat_id', 'rule', 'send_ticket',
+        'original_message_text', 'message_text', 'check_message_text',
+        'media_files', 'sender_info', 'time_info', 'original_link', 'buttons',
+        'should_forward', 'is_media_group', 'media_group_id', 'media_group_messages',
+        'album', 'is_pure_link_preview', 'skipped_media', 'errors',
+    )
+    
+    def __init__(self, client, event, chat_id, rule, send_ticket=None):
         """
         初始化消息上下文
         
@@ -14,11 +24,13 @@ class MessageContext:
             event: 消息事件
             chat_id: 聊天ID
             rule: 转发规则
+            send_ticket: 目标聊天的发送顺序凭证
         """
         self.client = client
         self.event = event
         self.chat_id = chat_id
         self.rule = rule
+        self.send_ticket = send_ticket
         
         # 初始消息文本，保持不变用于引用
         self.original_message_text = event.message.text or ''
@@ -52,6 +64,12 @@ class MessageContext:
         self.media_group_id = event.message.grouped_id
         self.media_group_messages = []
         
+        # 聚合器收集的完整媒体组
+        self.album = album_aggregator.get(event.message) if self.is_media_group else None
+        
+        # 是否是纯链接预览消息
+        self.is_pure_link_preview = False
+        
         # 用于跟踪被跳过的超大媒体
         self.skipped_media = []
         
@@ -59,5 +77,24 @@ class MessageContext:
         self.errors = []
         
     def clone(self):
-        """创建上下文的副本"""
-        return copy.deepcopy(self) 
\ No newline at end of file
+        """
+        创建上下文的副本
+        
+        事件、客户端、规则和媒体组等只读对象在副本间共享，只复制可变的列表字段，
+        修改副本的文本、按钮和媒体列表不会影响原上下文。
+        副本不持有媒体缓存的引用，媒体文件仍由原上下文释放
+        """
+        clone = MessageContext.__new__(MessageContext)
+        for name in self.__slots__:
+            setattr(clone, name, getattr(self, name))
+        clone.media_files = list(self.media_files)
+        clone.media_group_messages = list(self.media_group_messages)
+        clone.skipped_media = list(self.skipped_media)
+        clone.errors = list(self.errors)
+        if isinstance(self.buttons, list):
+            clone.buttons = [list(row) if isinstance(row, list) else row for row in self.buttons]
+        return clone
+    
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'MessageContext({fields})'
@@ -1,10 +1,26 @@
-import asyncio
 import logging
+from contextlib import nullcontext
 from filters.base_filter import BaseFilter
 from utils.common import get_main_module
+from managers.delay_scheduler import delay_scheduler
+from managers.edit_tracker import edit_tracker
+from utils.constants import DELAY_EDIT_TRACKING
 
 logger = logging.getLogger(__name__)
 
+
+def _copy_event(event):
+    """
+    浅复制消息事件
+
+    Telethon 的事件在 __getattr__ 中读取 self.message，copy.copy 创建的空实例上会无限递归，
+    因此直接复制实例字典
+    """
+    copied = object.__new__(type(event))
+    copied.__dict__.update(event.__dict__)
+    return copied
+
+
 class DelayFilter(BaseFilter):
     """
     延迟过滤器，等待消息可能的编辑后再处理
@@ -44,22 +60,37 @@ class DelayFilter(BaseFilter):
             
             logger.info(f"[规则ID:{rule.id}] 延迟处理消息 {original_id}，等待 {rule.delay_seconds} 秒...")
             
-            # 等待指定的秒数
-            await asyncio.sleep(rule.delay_seconds)
-            logger.info(f"[规则ID:{rule.id}] 延迟 {rule.delay_seconds} 秒结束，正在获取最新消息...")
-            
             # 尝试获取用户客户端
             try:
                 main = await get_main_module()
                 client = main.user_client if (main and hasattr(main, 'user_client')) else context.client
                 
-                # 获取更新后的消息
-                logger.info(f"[规则ID:{rule.id}] 正在获取聊天 {chat_id} 的消息 {original_id}...")
-                updated_message = await client.get_messages(chat_id, ids=original_id)
+                # 由延迟调度器等待指定的秒数后获取更新后的消息，
+                # 同一时间到期的消息（包括其他规则等待的消息）合并为一次请求。
+                # 等待期间让出转发并发名额，不阻塞其他规则
+                idle = context.send_ticket.idle() if context.send_ticket else nullcontext()
+                if DELAY_EDIT_TRACKING:
+                    # 消息被编辑后立即结束等待，最长等待 delay_seconds 秒
+                    messages = context.album.messages if context.album else [context.event.message]
+                    async with idle:
+                        updated_messages = await edit_tracker.wait(client, chat_id, messages, rule.delay_seconds)
+                    logger.info(f"[规则ID:{rule.id}] 延迟等待结束，已获取聊天 {chat_id} 的最新消息")
+                else:
+                    message_ids = context.album.message_ids if context.album else [original_id]
+                    async with idle:
+                        updated_messages = await delay_scheduler.refetch_after(client, chat_id, message_ids, rule.delay_seconds)
+                    logger.info(f"[规则ID:{rule.id}] 延迟 {rule.delay_seconds} 秒结束，已获取聊天 {chat_id} 的最新消息")
+                
+                if context.album:
+                    # 媒体组的所有消息一次获取
+                    context.album = context.album.replace(updated_messages)
+                updated_message = next((m for m in updated_messages if m and m.id == original_id), None)
 
                 
                 if updated_message:
-                    updated_text = getattr(updated_message, "text", "")
+                    # 媒体组的文本和按钮取自带文本的那条消息
+                    text_message = (context.album and context.album.caption_message) or updated_message
+                    updated_text = getattr(text_message, "text", "")
                     
                     # 不管消息内容是否有变化，都更新上下文中的所有相关字段
                     logger.info(f"[规则ID:{rule.id}] 正在更新上下文中的消息数据...")
@@ -68,12 +99,13 @@ class DelayFilter(BaseFilter):
                     context.message_text = updated_text
                     context.check_message_text = updated_text
                     
-                    # 更新事件中的消息对象
+                    # 更新事件中的消息对象，事件由同一消息的其他规则共享，只修改本规则的副本
+                    context.event = _copy_event(context.event)
                     context.event.message = updated_message
                     
                     # 更新其他相关字段
                     context.original_message_text = updated_text
-                    context.buttons = updated_message.buttons if hasattr(updated_message, 'buttons') else None
+                    context.buttons = text_message.buttons if hasattr(text_message, 'buttons') else None
                     
                     # 更新媒体相关信息
                     if hasattr(updated_message, 'media') and updated_message.media:
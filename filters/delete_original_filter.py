@@ -32,17 +32,10 @@ class DeleteOriginalFilter(BaseFilter):
             user_client = main.user_client  # 获取用户客户端
             
             # 媒体组消息
-            if event.message.grouped_id:
-                # 使用用户客户端获取并删除媒体组消息
-                async for message in user_client.iter_messages(
-                        event.chat_id,
-                        min_id=event.message.id - 10,
-                        max_id=event.message.id + 10,
-                        reverse=True
-                ):
-                    if message.grouped_id == event.message.grouped_id:
-                        await message.delete()
-                        logger.info(f'已删除媒体组消息 ID: {message.id}')
+            if context.album:
+                # 使用用户客户端一次删除媒体组的所有消息
+                await user_client.delete_messages(event.chat_id, context.album.message_ids)
+                logger.info(f'已删除媒体组消息 ID: {context.album.message_ids}')
             else:
                 # 单条消息的删除逻辑
                 message = await user_client.get_messages(event.chat_id, ids=event.message.id)
@@ -3,7 +3,8 @@ import os
 from filters.base_filter import BaseFilter
 from enums.enums import HandleMode, PreviewMode
 from utils.common import get_main_module
-from telethon.tl.types import Channel
+from telethon.tl.types import PeerChannel
+from managers.peer_cache import peer_cache
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -35,11 +36,12 @@ class EditFilter(BaseFilter):
             return True
             
         # 检查是否为频道消息
-        chat = await event.get_chat()
-        logger.debug(f"聊天类型: {type(chat).__name__}, 聊天ID: {chat.id}, 聊天标题: {getattr(chat, 'title', '未知')}")
+        peer = event.message.peer_id
+        chat_info = peer_cache.get(event.chat_id)
+        logger.debug(f"聊天类型: {type(peer).__name__}, 聊天ID: {event.chat_id}, 聊天标题: {chat_info.title if chat_info else '未知'}")
         
-        if not isinstance(chat, Channel):
-            logger.info(f"不是频道消息 (聊天类型: {type(chat).__name__})，跳过编辑")
+        if not isinstance(peer, PeerChannel):
+            logger.info(f"不是频道消息 (聊天类型: {type(peer).__name__})，跳过编辑")
             return False
             
         try:
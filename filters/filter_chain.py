@@ -1,6 +1,7 @@
 import logging
 from filters.base_filter import BaseFilter
 from filters.context import MessageContext
+from managers.media_cache import media_cache
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,7 @@ class FilterChain:
         self.filters.append(filter_obj)
         return self
         
-    async def process(self, client, event, chat_id, rule):
+    async def process(self, client, event, chat_id, rule, send_ticket=None):
         """
         处理消息
         
@@ -34,26 +35,33 @@ class FilterChain:
             event: 消息事件
             chat_id: 聊天ID
             rule: 转发规则
+            send_ticket: 目标聊天的发送顺序凭证
             
         Returns:
             bool: 表示处理是否成功
         """
         # 创建消息上下文
-        context = MessageContext(client, event, chat_id, rule)
+        context = MessageContext(client, event, chat_id, rule, send_ticket)
         
         logger.info(f"开始过滤器链处理，共 {len(self.filters)} 个过滤器")
         
-        # 依次执行每个过滤器
-        for filter_obj in self.filters:
-            try:
-                should_continue = await filter_obj.process(context)
-                if not should_continue:
-                    logger.info(f"过滤器 {filter_obj.name} 中断了处理链")
+        try:
+            # 依次执行每个过滤器
+            for filter_obj in self.filters:
+                try:
+                    should_continue = await filter_obj.process(context)
+                    if not should_continue:
+                        logger.info(f"过滤器 {filter_obj.name} 中断了处理链")
+                        return False
+                except Exception as e:
+                    logger.error(f"过滤器 {filter_obj.name} 处理出错: {str(e)}")
+                    context.errors.append(f"过滤器 {filter_obj.name} 错误: {str(e)}")
                     return False
-            except Exception as e:
-                logger.error(f"过滤器 {filter_obj.name} 处理出错: {str(e)}")
-                context.errors.append(f"过滤器 {filter_obj.name} 错误: {str(e)}")
-                return False
+        finally:
+            # 释放本次处理占用的媒体文件
+            for file in context.media_files:
+                if isinstance(file, str):
+                    media_cache.release(file)
         
         logger.info("过滤器链处理完成")
-        return True 
\ No newline at end of file
+        return True
@@ -27,34 +27,19 @@ class InitFilter(BaseFilter):
         rule = context.rule
         event = context.event
 
-        logger.info(f"InitFilter处理消息前，context: {context.__dict__}")
+        logger.info(f"InitFilter处理消息前，context: {context}")
         try:
             #处理媒体组消息
-            if event.message.grouped_id:
-                # 等待更长时间让所有媒体消息到达
-                # await asyncio.sleep(1)
-                
-                # 收集媒体组的所有消息
-                try:
-                    async for message in event.client.iter_messages(
-                        event.chat_id,
-                        limit=20,
-                        min_id=event.message.id - 10,
-                        max_id=event.message.id + 10
-                    ):
-                        if message.grouped_id == event.message.grouped_id:
-                            if message.text:    
-                                # 保存第一条消息的文本和按钮
-                                context.message_text = message.text or ''
-                                context.original_message_text = message.text or ''
-                                context.check_message_text = message.text or ''
-                                context.buttons = message.buttons if hasattr(message, 'buttons') else None
-                            logger.info(f'获取到媒体组文本并添加到context: {message.text}')
-                        
-                except Exception as e:
-                    logger.error(f'收集媒体组消息时出错: {str(e)}')
-                    context.errors.append(f"收集媒体组消息错误: {str(e)}")
+            if context.album:
+                # 媒体组的文本和按钮只在其中一条消息上
+                message = context.album.caption_message
+                if message:
+                    context.message_text = message.text or ''
+                    context.original_message_text = message.text or ''
+                    context.check_message_text = message.text or ''
+                    context.buttons = message.buttons if hasattr(message, 'buttons') else None
+                    logger.info(f'获取到媒体组文本并添加到context: {message.text}')
            
         finally:
-            logger.info(f"InitFilter处理消息后，context: {context.__dict__}")
+            logger.info(f"InitFilter处理消息后，context: {context}")
             return True
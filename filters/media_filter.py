@@ -4,7 +4,8 @@ import asyncio
 from utils.media import get_media_size
 from utils.constants import TEMP_DIR
 from filters.base_filter import BaseFilter
-from utils.media import get_max_media_size
+from utils.media import get_max_media_size, media_references
+from managers.media_cache import media_cache
 from enums.enums import PreviewMode
 
 logger = logging.getLogger(__name__)
@@ -49,35 +50,20 @@ class MediaFilter(BaseFilter):
         
         logger.info(f'处理媒体组消息 组ID: {event.message.grouped_id}')
         
-        # 等待更长时间让所有媒体消息到达
-        await asyncio.sleep(1)
+        if not context.album:
+            logger.warning(f'未找到媒体组 {event.message.grouped_id} 的消息')
+            return
         
-        # 收集媒体组的所有消息
-        try:
-            async for message in event.client.iter_messages(
-                event.chat_id,
-                limit=20,
-                min_id=event.message.id - 10,
-                max_id=event.message.id + 10
-            ):
-                if message.grouped_id == event.message.grouped_id:
-                    # # 保存第一条消息的文本和按钮
-                    # if not context.message_text:
-                    #     context.message_text = message.text or ''
-                    #     context.buttons = message.buttons if hasattr(message, 'buttons') else None
-                    #     logger.info(f'获取到媒体组文本: {context.message_text}')
-                    
-                    # 检查媒体大小
-                    if message.media:
-                        file_size = await get_media_size(message.media)
-                        if MAX_MEDIA_SIZE and file_size > MAX_MEDIA_SIZE:
-                            context.skipped_media.append((message, file_size))
-                            continue
-                    context.media_group_messages.append(message)
-                    logger.info(f'找到媒体组消息: ID={message.id}, 类型={type(message.media).__name__ if message.media else "无媒体"}')
-        except Exception as e:
-            logger.error(f'收集媒体组消息时出错: {str(e)}')
-            context.errors.append(f"收集媒体组消息错误: {str(e)}")
+        # 使用聚合器收集的媒体组消息
+        for message in context.album.messages:
+            # 检查媒体大小
+            if message.media:
+                file_size = await get_media_size(message.media)
+                if MAX_MEDIA_SIZE and file_size > MAX_MEDIA_SIZE:
+                    context.skipped_media.append((message, file_size))
+                    continue
+            context.media_group_messages.append(message)
+            logger.info(f'找到媒体组消息: ID={message.id}, 类型={type(message.media).__name__ if message.media else "无媒体"}')
         
         logger.info(f'共找到 {len(context.media_group_messages)} 条媒体组消息，{len(context.skipped_media)} 条超限')
     
@@ -120,9 +106,15 @@ class MediaFilter(BaseFilter):
                 logger.info(f'媒体文件超过大小限制 ({MAX_MEDIA_SIZE/1024/1024:.2f}MB)')
                 context.skipped_media.append((event.message, file_size))
             else:
+                # 发送客户端可以直接访问该媒体时按引用发送，无需下载
+                reference = media_references.get(context.client, event.message)
+                if reference is not None:
+                    context.media_files.append(reference)
+                    logger.info('媒体将按文件引用发送，跳过下载')
+                    return
                 try:
-                    # 下载媒体文件
-                    file_path = await event.message.download_media(TEMP_DIR)
+                    # 下载媒体文件（同一媒体在所有规则间只下载一次）
+                    file_path = await media_cache.acquire(event.message)
                     if file_path:
                         context.media_files.append(file_path)
                         logger.info(f'媒体文件已下载到: {file_path}')
@@ -1,4 +1,5 @@
 import logging
+from enums.enums import HandleMode
 from filters.filter_chain import FilterChain
 from filters.keyword_filter import KeywordFilter
 from filters.replace_filter import ReplaceFilter
@@ -11,60 +12,88 @@ from filters.delay_filter import DelayFilter
 from filters.edit_filter import EditFilter
 from filters.comment_button_filter import CommentButtonFilter
 from filters.init_filter import InitFilter
+from managers.rule_index import RuleSnapshot
 logger = logging.getLogger(__name__)
 
-async def process_forward_rule(client, event, chat_id, rule):
+# 过滤器按执行顺序排列，每个过滤器附带判断规则是否需要它的条件。
+# 过滤器本身不保存状态，所有规则共用同一组实例
+FILTER_STAGES = (
+    # 初始化过滤器
+    (InitFilter(), lambda rule: True),
+    # 延迟处理过滤器（如果启用了延迟处理）
+    (DelayFilter(), lambda rule: rule.enable_delay and rule.delay_seconds > 0),
+    # 关键字过滤器（如果消息不匹配关键字，会中断处理链）
+    (KeywordFilter(), lambda rule: True),
+    # 替换过滤器
+    (ReplaceFilter(), lambda rule: rule.is_replace),
+    # AI处理过滤器（如果启用了AI处理后的关键字检查，可能会中断处理链）
+    (AIFilter(), lambda rule: rule.is_ai),
+    # 信息过滤器（处理原始链接和发送者信息）
+    (InfoFilter(), lambda rule: rule.is_original_link or rule.is_original_sender or rule.is_original_time),
+    # 媒体过滤器（处理媒体内容）
+    (MediaFilter(), lambda rule: True),
+    # 评论区按钮过滤器
+    (CommentButtonFilter(), lambda rule: rule.enable_comment_button),
+    # 编辑过滤器（编辑原始消息，编辑模式下总是中断处理链）
+    (EditFilter(), lambda rule: rule.handle_mode == HandleMode.EDIT),
+    # 发送过滤器（发送消息）
+    (SenderFilter(), lambda rule: rule.handle_mode != HandleMode.EDIT),
+    # 删除原始消息过滤器（最后执行）
+    (DeleteOriginalFilter(), lambda rule: rule.handle_mode != HandleMode.EDIT and rule.is_delete_original),
+)
+
+# 规则ID -> (编译时的规则, 启用的过滤器标记, 过滤器链)
+_pipeline_cache = {}
+
+
+def get_filter_chain(rule):
+    """
+    获取规则编译后的过滤器链，只包含规则启用的功能对应的过滤器
+
+    规则设置变化导致启用的过滤器不同时重新编译
+
+    Args:
+        rule: 规则快照或 ForwardRule 对象
+
+    Returns:
+        FilterChain: 过滤器链
+    """
+    cached = _pipeline_cache.get(rule.id)
+    # 规则快照不可变，同一快照直接复用
+    if cached and cached[0] is rule and isinstance(rule, RuleSnapshot):
+        return cached[2]
+
+    enabled = tuple(bool(condition(rule)) for _, condition in FILTER_STAGES)
+    if cached and cached[1] == enabled:
+        filter_chain = cached[2]
+    else:
+        filter_chain = FilterChain()
+        for (filter_obj, _), is_enabled in zip(FILTER_STAGES, enabled):
+            if is_enabled:
+                filter_chain.add_filter(filter_obj)
+        logger.info(f'规则 {rule.id} 的过滤器链已编译: {", ".join(f.name for f in filter_chain.filters)}')
+
+    _pipeline_cache[rule.id] = (rule, enabled, filter_chain)
+    return filter_chain
+
+
+async def process_forward_rule(client, event, chat_id, rule, send_ticket=None):
     """
     处理转发规则
-    
+
     Args:
         client: 机器人客户端
         event: 消息事件
         chat_id: 聊天ID
         rule: 转发规则
-        
+        send_ticket: 目标聊天的发送顺序凭证
+
     Returns:
         bool: 处理是否成功
     """
     logger.info(f'使用过滤器链处理规则 ID: {rule.id}')
-    
-    # 创建过滤器链
-    filter_chain = FilterChain()
-
-    # 添加初始化过滤器
-    filter_chain.add_filter(InitFilter())
 
-    # 延迟处理过滤器（如果启用了延迟处理）
-    filter_chain.add_filter(DelayFilter())
-    
-    # 添加关键字过滤器（如果消息不匹配关键字，会中断处理链）
-    filter_chain.add_filter(KeywordFilter())
-    
-    # 添加替换过滤器
-    filter_chain.add_filter(ReplaceFilter())
-    
-    # 添加AI处理过滤器（如果启用了AI处理后的关键字检查，可能会中断处理链）
-    filter_chain.add_filter(AIFilter())
-    
-    # 添加信息过滤器（处理原始链接和发送者信息）
-    filter_chain.add_filter(InfoFilter())
-    
-    # 添加媒体过滤器（处理媒体内容）
-    filter_chain.add_filter(MediaFilter())
-    
-    # 添加评论区按钮过滤器
-    filter_chain.add_filter(CommentButtonFilter())
-    
-    # 添加编辑过滤器（编辑原始消息）
-    filter_chain.add_filter(EditFilter())
-    
-    # 添加发送过滤器（发送消息）
-    filter_chain.add_filter(SenderFilter())
-    
-    # 添加删除原始消息过滤器（最后执行）
-    filter_chain.add_filter(DeleteOriginalFilter())
-    
     # 执行过滤器链
-    result = await filter_chain.process(client, event, chat_id, rule)
-    
-    return result 
+    result = await get_filter_chain(rule).process(client, event, chat_id, rule, send_ticket)
+
+    return result
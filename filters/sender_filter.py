@@ -1,10 +1,17 @@
 import logging
-import os
 from filters.base_filter import BaseFilter
+from telethon import errors
 from enums.enums import PreviewMode
+from utils.media import media_references
+from managers.media_cache import media_cache, media_uploads
+from managers.send_scheduler import send_scheduler
+from managers.outbox_manager import outbox
 
 logger = logging.getLogger(__name__)
 
+# 表示媒体引用或已上传文件失效的错误
+STALE_MEDIA_ERRORS = ('FILE_REFERENCE_', 'FILE_PART', 'MEDIA_EMPTY', 'MEDIA_INVALID')
+
 class SenderFilter(BaseFilter):
     """
     消息发送过滤器，用于发送处理后的消息
@@ -49,11 +56,25 @@ class SenderFilter(BaseFilter):
                 await self._send_text_message(context, target_chat_id, parse_mode)
                 
             logger.info(f'消息已发送到: {target_chat.name} ({target_chat_id})')
+            outbox.mark_delivered(rule.id, event.chat_id, event.message.id)
             return True
         except Exception as e:
             logger.error(f'发送消息时出错: {str(e)}')
             context.errors.append(f"发送消息错误: {str(e)}")
             return False
+        finally:
+            # 发送结束后立即让出目标聊天，后续过滤器不再阻塞同一目标的其他消息
+            if context.send_ticket:
+                context.send_ticket.release()
+    
+    def _mark_rendered(self, context, text, media_ids=()):
+        """在发件箱中记录渲染结果，发送过程中进程重启时直接发送保存的内容"""
+        outbox.mark_rendered(context.rule.id, context.event.chat_id, context.event.message.id, text, media_ids)
+    
+    async def _wait_turn(self, context):
+        """等待同一目标聊天中更早的消息发送完成"""
+        if context.send_ticket:
+            await context.send_ticket.wait_turn()
     
     async def _send_media_group(self, context, target_chat_id, parse_mode):
         """发送媒体组消息"""
@@ -71,7 +92,12 @@ class SenderFilter(BaseFilter):
             # 组合完整文本
             text_to_send = context.sender_info + text_to_send + context.time_info + context.original_link
             
-            await client.send_message(
+            self._mark_rendered(context, text_to_send)
+            await self._wait_turn(context)
+            await send_scheduler.send(
+                client,
+                target_chat_id,
+                client.send_message,
                 target_chat_id,
                 text_to_send,
                 parse_mode=parse_mode,
@@ -82,21 +108,31 @@ class SenderFilter(BaseFilter):
             return
             
         # 如果有可以发送的媒体，作为一个组发送
+        downloaded = []
         try:
+            messages = []
             files = []
             for message in context.media_group_messages:
                 if message.media:
-                    file_path = await message.download_media(os.path.join(os.getcwd(), 'temp'))
-                    if file_path:
-                        files.append(file_path)
+                    # 优先使用发送客户端可以直接访问的媒体引用，否则从媒体缓存获取
+                    file = media_references.get(client, message)
+                    if file is None:
+                        file = await media_cache.acquire(message)
+                        downloaded.append(file)
+                    if file:
+                        messages.append(message)
+                        files.append(file)
             
             if files:
                 # 添加发送者信息、时间信息和原始链接
                 caption_text = context.sender_info + context.message_text + context.time_info + context.original_link
+                self._mark_rendered(context, caption_text, [message.id for message in messages])
                 
                 # 作为一个组发送所有文件
-                await client.send_file(
+                await self._send_media(
+                    context,
                     target_chat_id,
+                    messages,
                     files,
                     caption=caption_text,
                     parse_mode=parse_mode,
@@ -108,16 +144,13 @@ class SenderFilter(BaseFilter):
                     }[rule.is_preview]
                 )
                 logger.info(f'媒体组消息已发送')
-            
-            # 删除临时文件
-            for file_path in files:
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    logger.error(f'删除临时文件失败: {str(e)}')
         except Exception as e:
             logger.error(f'发送媒体组消息时出错: {str(e)}')
             raise
+        finally:
+            # 释放媒体缓存中的文件
+            for file_path in downloaded:
+                media_cache.release(file_path)
     
     async def _send_single_media(self, context, target_chat_id, parse_mode):
         """发送单条媒体消息"""
@@ -137,7 +170,12 @@ class SenderFilter(BaseFilter):
             if rule.is_original_link:
                 text_to_send += original_link
                 
-            await client.send_message(
+            self._mark_rendered(context, text_to_send)
+            await self._wait_turn(context)
+            await send_scheduler.send(
+                client,
+                target_chat_id,
+                client.send_message,
                 target_chat_id,
                 text_to_send,
                 parse_mode=parse_mode,
@@ -148,7 +186,7 @@ class SenderFilter(BaseFilter):
             return
             
         # 发送媒体文件
-        for file_path in context.media_files:
+        for file in context.media_files:
             try:
                 caption = (
                     context.sender_info + 
@@ -156,10 +194,13 @@ class SenderFilter(BaseFilter):
                     context.time_info + 
                     context.original_link
                 )
+                self._mark_rendered(context, caption, [context.event.message.id])
                 
-                await client.send_file(
+                await self._send_media(
+                    context,
                     target_chat_id,
-                    file_path,
+                    [context.event.message],
+                    file,
                     caption=caption,
                     parse_mode=parse_mode,
                     buttons=context.buttons,
@@ -170,16 +211,76 @@ class SenderFilter(BaseFilter):
                     }[rule.is_preview]
                 )
                 logger.info(f'媒体消息已发送')
-                
-                # 删除临时文件
-                try:
-                    os.remove(file_path)
-                except Exception as e:
-                    logger.error(f'删除临时文件失败: {str(e)}')
             except Exception as e:
                 logger.error(f'发送媒体消息时出错: {str(e)}')
                 raise
     
+    async def _send_media(self, context, target_chat_id, messages, file, **kwargs):
+        """
+        发送媒体，本地文件只上传一次，媒体引用或已上传的文件失效时重新下载上传
+        
+        Args:
+            context: 消息上下文
+            target_chat_id: 目标聊天ID
+            messages: 媒体对应的源消息列表
+            file: 文件路径或媒体引用，媒体组为列表
+            **kwargs: 传给 send_file 的其他参数
+            
+        Returns:
+            发送结果
+        """
+        client = context.client
+        files = list(file) if isinstance(file, list) else [file]
+        downloaded = []
+        
+        try:
+            prepared = await self._prepare_media(client, messages, files)
+            await self._wait_turn(context)
+            try:
+                sent = await self._send_file(client, target_chat_id, prepared if isinstance(file, list) else prepared[0], **kwargs)
+            except errors.BadRequestError as e:
+                if not e.message.startswith(STALE_MEDIA_ERRORS):
+                    raise
+                # 文件引用过期、发送客户端无权访问该媒体或上传的文件已过期
+                logger.warning(f'媒体引用或已上传的文件已失效，重新下载上传: {str(e)}')
+                for index, (f, message) in enumerate(zip(files, messages)):
+                    media_references.discard(client, message)
+                    media_uploads.discard(client, message)
+                    if not isinstance(f, str):
+                        files[index] = await media_cache.acquire(message)
+                        downloaded.append(files[index])
+                prepared = await self._prepare_media(client, messages, files)
+                sent = await self._send_file(client, target_chat_id, prepared if isinstance(file, list) else prepared[0], **kwargs)
+        finally:
+            for file_path in downloaded:
+                media_cache.release(file_path)
+        
+        # 记录发送结果中的媒体，之后发往其他目标时可以直接按引用发送
+        sent_messages = sent if isinstance(sent, list) else [sent]
+        if len(sent_messages) == len(messages):
+            for message, sent_message in zip(messages, sent_messages):
+                media_references.remember(client, message, sent_message.media)
+        return sent
+    
+    async def _send_file(self, client, target_chat_id, file, **kwargs):
+        """通过出站调度器发送文件，媒体组按消息条数限速"""
+        return await send_scheduler.send(
+            client,
+            target_chat_id,
+            client.send_file,
+            target_chat_id,
+            file,
+            cost=len(file) if isinstance(file, list) else 1,
+            **kwargs
+        )
+    
+    async def _prepare_media(self, client, messages, files):
+        """将本地文件替换为已上传的文件句柄，同一媒体在所有目标间只上传一次"""
+        return [
+            await media_uploads.get_input_media(client, message, f) if isinstance(f, str) else f
+            for f, message in zip(files, messages)
+        ]
+    
     async def _send_text_message(self, context, target_chat_id, parse_mode):
         """发送纯文本消息"""
         rule = context.rule
@@ -199,7 +300,12 @@ class SenderFilter(BaseFilter):
         # 组合消息文本
         message_text = context.sender_info + context.message_text + context.time_info + context.original_link
         
-        await client.send_message(
+        self._mark_rendered(context, message_text)
+        await self._wait_turn(context)
+        await send_scheduler.send(
+            client,
+            target_chat_id,
+            client.send_message,
             target_chat_id,
             message_text,
             parse_mode=parse_mode,
@@ -13,6 +13,7 @@ from utils.common import *
 from utils.media import *
 from datetime import datetime, timedelta
 from filters.process import process_forward_rule
+from utils.ttl_cache import TTLCache
 
 
 
@@ -24,19 +25,15 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 
 load_dotenv()
 
-# 添加缓存字典
-_admin_cache = {}
-_CACHE_DURATION = timedelta(minutes=30)  # 缓存30分钟
+# 频道管理员缓存，缓存30分钟
+_admin_cache = TTLCache(ttl=30 * 60, maxsize=1000, name='频道管理员缓存')
 
 async def get_channel_admins(client, chat_id):
     """获取频道管理员列表，带缓存机制"""
-    current_time = datetime.now()
-    
     # 检查缓存是否存在且未过期
-    if chat_id in _admin_cache:
-        cache_data = _admin_cache[chat_id]
-        if current_time - cache_data['timestamp'] < _CACHE_DURATION:
-            return cache_data['admin_ids']
+    admin_ids = _admin_cache.get(chat_id)
+    if admin_ids is not None:
+        return admin_ids
     
     # 缓存不存在或已过期，重新获取管理员列表
     try:
@@ -44,10 +41,7 @@ async def get_channel_admins(client, chat_id):
         admin_ids = [admin.id for admin in admins]
         
         # 更新缓存
-        _admin_cache[chat_id] = {
-            'admin_ids': admin_ids,
-            'timestamp': current_time
-        }
+        _admin_cache.set(chat_id, admin_ids)
         return admin_ids
     except Exception as e:
         logger.error(f'获取频道管理员列表失败: {str(e)}')
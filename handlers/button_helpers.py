@@ -2,6 +2,7 @@ from telethon import Button
 from utils.constants import *
 from utils.settings import load_summary_times, load_ai_models, load_delay_times
 from managers.settings_manager import AI_SETTINGS, AI_MODELS
+from ai import provider_registry
 
 SUMMARY_TIMES = load_summary_times()
 AI_MODELS= load_ai_models()
@@ -64,15 +65,20 @@ async def create_list_buttons(total_pages, current_page, command):
 
 
 # 添加模型选择按钮创建函数
-async def create_model_buttons(rule_id, page=0):
+async def create_model_buttons(rule_id, page=0, select_action='select_model', page_action='model_page', allow_none=False):
     """创建模型选择按钮，支持分页
 
     Args:
         rule_id: 规则ID
         page: 当前页码（从0开始）
+        select_action: 选择模型的回调动作
+        page_action: 翻页的回调动作
+        allow_none: 是否显示"不使用"按钮
     """
     buttons = []
-    total_models = len(AI_MODELS)
+    # ai_models.txt 修改后无需重启即可选择新模型
+    models = provider_registry.get_models() or AI_MODELS
+    total_models = len(models)
     total_pages = (total_models + MODELS_PER_PAGE - 1) // MODELS_PER_PAGE
 
     # 计算当前页的模型范围
@@ -80,20 +86,23 @@ async def create_model_buttons(rule_id, page=0):
     end_idx = min(start_idx + MODELS_PER_PAGE, total_models)
 
     # 添加模型按钮
-    for model in AI_MODELS[start_idx:end_idx]:
-        buttons.append([Button.inline(f"{model}", f"select_model:{rule_id}:{model}")])
+    for model in models[start_idx:end_idx]:
+        buttons.append([Button.inline(f"{model}", f"{select_action}:{rule_id}:{model}")])
 
     # 添加导航按钮
     nav_buttons = []
     if page > 0:  # 不是第一页，显示"上一页"
-        nav_buttons.append(Button.inline("⬅️ 上一页", f"model_page:{rule_id}:{page - 1}"))
+        nav_buttons.append(Button.inline("⬅️ 上一页", f"{page_action}:{rule_id}:{page - 1}"))
     # 添加页码显示在中间
     nav_buttons.append(Button.inline(f"{page + 1}/{total_pages}", f"noop:{rule_id}"))
     if page < total_pages - 1:  # 不是最后一页，显示"下一页"
-        nav_buttons.append(Button.inline("下一页 ➡️", f"model_page:{rule_id}:{page + 1}"))
+        nav_buttons.append(Button.inline("下一页 ➡️", f"{page_action}:{rule_id}:{page + 1}"))
     if nav_buttons:
         buttons.append(nav_buttons)
 
+    if allow_none:
+        buttons.append([Button.inline("不使用", f"{select_action}:{rule_id}:")])
+
     # 添加返回按钮
     buttons.append([Button.inline("返回", f"rule_settings:{rule_id}")])
 
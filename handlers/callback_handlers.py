@@ -16,6 +16,9 @@ from utils.common import is_admin
 
 logger = logging.getLogger(__name__)
 
+# 设置提示词状态的超时时间（秒）
+STATE_TIMEOUT = 5 * 60
+
 
 
 
@@ -287,14 +290,6 @@ async def callback_toggle_current(event, rule_id, session, message):
     await event.answer(f'已切换到: {source_chat.name}')
 
 
-async def cancel_state_after_timeout(user_id: int, chat_id: int, timeout_minutes: int = 5):
-    """在指定时间后自动取消状态"""
-    await asyncio.sleep(timeout_minutes * 60)
-    current_state = state_manager.get_state(user_id, chat_id)
-    if current_state:  # 只有当状态还存在时才清除
-        logger.info(f"状态超时自动取消 - user_id: {user_id}, chat_id: {chat_id}")
-        state_manager.clear_state(user_id, chat_id)
-
 async def callback_set_summary_prompt(event, rule_id, session, message):
     """处理设置AI总结提示词的回调"""
     logger.info(f"开始处理设置AI总结提示词回调 - event: {event}, rule_id: {rule_id}")
@@ -319,9 +314,8 @@ async def callback_set_summary_prompt(event, rule_id, session, message):
     
     logger.info(f"准备设置状态 - user_id: {user_id}, chat_id: {chat_id}, state: {state}")
     try:
-        state_manager.set_state(user_id, chat_id, state)
-        # 启动超时取消任务
-        asyncio.create_task(cancel_state_after_timeout(user_id, chat_id))
+        # 5分钟内未设置将自动取消
+        state_manager.set_state(user_id, chat_id, state, timeout=STATE_TIMEOUT)
         logger.info("状态设置成功")
     except Exception as e:
         logger.error(f"设置状态时出错: {str(e)}")
@@ -365,9 +359,8 @@ async def callback_set_ai_prompt(event, rule_id, session, message):
 
     logger.info(f"准备设置状态 - user_id: {user_id}, chat_id: {chat_id}, state: {state}")
     try:
-        state_manager.set_state(user_id, chat_id, state)
-        # 启动超时取消任务
-        asyncio.create_task(cancel_state_after_timeout(user_id, chat_id))
+        # 5分钟内未设置将自动取消
+        state_manager.set_state(user_id, chat_id, state, timeout=STATE_TIMEOUT)
         logger.info("状态设置成功")
     except Exception as e:
         logger.error(f"设置状态时出错: {str(e)}")
@@ -484,7 +477,7 @@ async def handle_callback(event):
 
         # 处理 AI 设置中的切换操作
         if data.startswith(
-                ('toggle_ai:',  'change_model:',  'toggle_keyword_after_ai:')):
+                ('toggle_ai:',  'change_model:', 'change_fallback_model:', 'toggle_keyword_after_ai:', 'toggle_ai_cache:')):
             rule_id = data.split(':')[1]
             session = get_session()
             try:
@@ -500,6 +493,13 @@ async def handle_callback(event):
                     await event.answer(f'AI处理后关键字过滤已{"开启" if rule.is_keyword_after_ai else "关闭"}')
                     return
 
+                if data.startswith('toggle_ai_cache:'):
+                    rule.enable_ai_cache = not rule.enable_ai_cache
+                    session.commit()
+                    await event.edit(await get_ai_settings_text(rule), buttons=await create_ai_settings_buttons(rule))
+                    await event.answer(f'AI处理结果复用已{"开启" if rule.enable_ai_cache else "关闭"}')
+                    return
+
                 if data.startswith('toggle_ai:'):
                     rule.is_ai = not rule.is_ai
                     session.commit()
@@ -508,6 +508,10 @@ async def handle_callback(event):
                 elif data.startswith('change_model:'):
                     await event.edit("请选择AI模型：", buttons=await create_model_buttons(rule_id, page=0))
                     return
+                elif data.startswith('change_fallback_model:'):
+                    await event.edit("请选择备用AI模型，AI模型调用失败或暂停调用时使用：", buttons=await create_model_buttons(
+                        rule_id, page=0, select_action='select_fb_model', page_action='fb_model_page', allow_none=True))
+                    return
             finally:
                 session.close()
             return
@@ -519,6 +523,30 @@ async def handle_callback(event):
             await event.edit("请选择AI模型：", buttons=await create_model_buttons(rule_id, page=page))
             return
 
+        if data.startswith('fb_model_page:'):
+            # 处理备用模型翻页
+            _, rule_id, page = data.split(':')
+            await event.edit("请选择备用AI模型，AI模型调用失败或暂停调用时使用：", buttons=await create_model_buttons(
+                rule_id, page=int(page), select_action='select_fb_model', page_action='fb_model_page', allow_none=True))
+            return
+
+        if data.startswith('select_fb_model:'):
+            # 处理备用模型选择，模型为空表示不使用备用模型
+            _, rule_id, model = data.split(':')
+            session = get_session()
+            try:
+                rule = session.query(ForwardRule).get(int(rule_id))
+                if rule:
+                    rule.ai_fallback_model = model or None
+                    session.commit()
+                    logger.info(f"已更新规则 {rule_id} 的备用AI模型为: {model or '不使用'}")
+
+                    # 返回到 AI 设置页面
+                    await event.edit(await get_ai_settings_text(rule), buttons=await create_ai_settings_buttons(rule))
+            finally:
+                session.close()
+            return
+
         if data.startswith('noop:'):
             # 用于页码按钮，不做任何操作
             await event.answer("当前页码")
@@ -3,6 +3,7 @@ import os
 import logging
 from utils.common import get_main_module, get_user_id
 from utils.constants import TEMP_DIR
+from managers.peer_cache import peer_cache
 
 logger = logging.getLogger(__name__)
 
@@ -25,8 +26,8 @@ async def handle_message_link(client, event):
         else:  # 公开频道格式
             chat_name = match.group(2)
             try:
-                entity = await client.get_entity(chat_name)
-                chat_id = entity.id
+                chat_info = await peer_cache.resolve_username(client, chat_name)
+                chat_id = chat_info.peer_id
             except Exception as e:
                 logger.error(f'获取频道信息失败: {str(e)}')
                 await event.reply('⚠️ 无法访问该频道，请确保已关注该频道。')
@@ -1,7 +1,9 @@
 import os
 import re
 from urlextract import URLExtract
-from ai import get_ai_provider
+from ai import ai_executor
+from managers.ai_cache import ai_cache
+from managers.ai_batcher import ai_batcher
 import logging
 
 logger = logging.getLogger(__name__)
@@ -39,34 +41,48 @@ async def ai_handle(message: str, rule) -> str:
             logger.info("AI处理未开启，返回原始消息")
             return message
         # 先读取数据库，如果ai模型为空，则使用.env中的默认模型
-        if not rule.ai_model:
-            rule.ai_model = os.getenv('DEFAULT_AI_MODEL')
-            logger.info(f"使用默认AI模型: {rule.ai_model}")
+        ai_model = rule.ai_model
+        if not ai_model:
+            ai_model = os.getenv('DEFAULT_AI_MODEL')
+            logger.info(f"使用默认AI模型: {ai_model}")
         else:
-            logger.info(f"使用规则配置的AI模型: {rule.ai_model}")
-            
-        provider = await get_ai_provider(rule.ai_model)
+            logger.info(f"使用规则配置的AI模型: {ai_model}")
+        fallback_model = rule.ai_fallback_model
         
-        if not rule.ai_prompt:
-            rule.ai_prompt = os.getenv('DEFAULT_AI_PROMPT')
+        ai_prompt = rule.ai_prompt
+        if not ai_prompt:
+            ai_prompt = os.getenv('DEFAULT_AI_PROMPT')
             logger.info("使用默认AI提示词")
         else:
             logger.info("使用规则配置的AI提示词")
         
-        if '{Message}'  in rule.ai_prompt:
+        # 提示词中包含消息内容时，每条消息的提示词都不同，无法批量处理
+        batchable = ai_batcher.enabled and '{Message}' not in ai_prompt
+        if '{Message}'  in ai_prompt:
             # 把提示词里的{Message}替换为message
-            rule.ai_prompt = rule.ai_prompt.replace('{Message}', message)
-            logger.info(f"处理后的AI提示词: {rule.ai_prompt}")
+            ai_prompt = ai_prompt.replace('{Message}', message)
+            logger.info(f"处理后的AI提示词: {ai_prompt}")
             
-        logger.info(f"提示词: {rule.ai_prompt}")
-        processed_text = await provider.process_message(
-            message=message,
-            prompt=rule.ai_prompt,
-            model=rule.ai_model
-        )
+        logger.info(f"提示词: {ai_prompt}")
+
+        async def process():
+            if batchable:
+                return await ai_batcher.submit(ai_model, ai_prompt, message, fallback_model)
+            return await ai_executor.process_message(
+                ai_model,
+                message,
+                prompt=ai_prompt,
+                fallback_model=fallback_model
+            )
+
+        if rule.enable_ai_cache:
+            processed_text = await ai_cache.get_or_process(ai_model, ai_prompt, message, process)
+        else:
+            processed_text = await process()
         logger.info(f"AI处理完成: {processed_text}")
         return processed_text
         
     except Exception as e:
+        # AI处理失败时转发原始消息，不把错误信息当作消息内容
         logger.error(f"AI处理消息时出错: {str(e)}")
         return message  
@@ -0,0 +1,105 @@
+import logging
+from telethon import events
+from handlers import user_handler
+from filters.process import process_forward_rule
+from managers.rule_index import rule_index
+from managers.dispatch_manager import forward_dispatcher
+from managers.outbox_manager import outbox, STATUS_RENDERED
+from managers.media_cache import media_cache
+from managers.album_manager import album_aggregator
+from managers.send_scheduler import send_scheduler
+from managers.peer_cache import resolve_peer
+
+logger = logging.getLogger(__name__)
+
+
+async def run_tracked_rule(process, client, event, chat_id, rule, send_ticket=None):
+    """执行转发规则，结束后在发件箱中标记该转发已处理完成"""
+    try:
+        return await process(client, event, chat_id, rule, send_ticket=send_ticket)
+    finally:
+        outbox.finish(rule.id, event.chat_id, event.message.id)
+
+
+def build_rule_job(rule, event, chat_id, user_client, bot_client):
+    """构建交给转发分发器的任务"""
+    if rule.use_bot:
+        # 直接使用过滤器模块中的process_forward_rule函数
+        return rule, run_tracked_rule, (process_forward_rule, bot_client, event, str(chat_id), rule)
+    return rule, run_tracked_rule, (user_handler.process_forward_rule, user_client, event, str(chat_id), rule)
+
+
+async def resume_outbox_entry(record, user_client, bot_client):
+    """
+    恢复一条上次未完成的转发
+
+    已渲染的机器人转发直接发送保存的文本和媒体，其余的重新获取源消息后重新执行规则
+    """
+    key = (record.rule_id, record.source_chat_id, record.message_id)
+    rule = rule_index.get_rule(record.rule_id)
+    if rule is None or not rule.enable_rule:
+        logger.info(f'规则 {record.rule_id} 已删除或未启用，放弃恢复转发')
+        outbox.finish(*key)
+        return
+
+    message = await user_client.get_messages(record.source_chat_id, ids=record.message_id)
+    if not message:
+        logger.warning(f'源消息 {record.source_chat_id}/{record.message_id} 已不存在，放弃恢复转发')
+        outbox.finish(*key)
+        return
+
+    if record.status == STATUS_RENDERED and rule.use_bot:
+        await resend_rendered(bot_client, user_client, rule, record)
+        return
+
+    logger.info(f'重新执行规则 {rule.id} 处理消息 {record.source_chat_id}/{record.message_id}')
+    if message.grouped_id:
+        # 与正常处理一样先收集媒体组，否则过滤器拿不到媒体组的其他消息
+        await album_aggregator.wait(user_client, message)
+    event = events.NewMessage.Event(message)
+    event._set_client(user_client)
+    chat_id, _ = resolve_peer(message.peer_id)
+    await forward_dispatcher.dispatch([build_rule_job(rule, event, chat_id, user_client, bot_client)])
+
+
+async def resend_rendered(bot_client, user_client, rule, record):
+    """发送发件箱中保存的渲染结果，发送失败的条目保持未完成状态，下次启动时再次恢复"""
+    key = (record.rule_id, record.source_chat_id, record.message_id)
+    target_chat_id = int(rule.target_chat.telegram_chat_id)
+    parse_mode = rule.message_mode.value
+
+    files = []
+    try:
+        if record.media_ids:
+            messages = await user_client.get_messages(record.source_chat_id, ids=record.media_ids)
+            for message in messages:
+                if message and message.media:
+                    file_path = await media_cache.acquire(message)
+                    if file_path:
+                        files.append(file_path)
+
+        if files:
+            await send_scheduler.send(
+                bot_client,
+                target_chat_id,
+                bot_client.send_file,
+                target_chat_id,
+                files if len(files) > 1 else files[0],
+                caption=record.text,
+                parse_mode=parse_mode,
+                cost=len(files)
+            )
+        elif record.text:
+            await send_scheduler.send(
+                bot_client,
+                target_chat_id,
+                bot_client.send_message,
+                target_chat_id,
+                record.text,
+                parse_mode=parse_mode
+            )
+        outbox.mark_delivered(*key)
+        logger.info(f'已恢复发送规则 {rule.id} 的消息到: {rule.target_chat.name} ({target_chat_id})')
+    finally:
+        for file_path in files:
+            media_cache.release(file_path)
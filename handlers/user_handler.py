@@ -4,12 +4,15 @@ import logging
 import asyncio
 from handlers.message_handler import pre_handle
 from utils.common import check_keywords, get_sender_info
+from managers.album_manager import album_aggregator
+from managers.send_scheduler import send_scheduler
+from managers.outbox_manager import outbox
 
 
 logger = logging.getLogger(__name__)
 
-async def process_forward_rule(client, event, chat_id, rule):
-    """处理转发规则（用户模式）"""
+async def process_forward_rule(client, event, chat_id, rule, send_ticket=None):
+    """处理转发规则（用户模式），send_ticket 为目标聊天的发送顺序凭证"""
     message_text = event.message.text or ''
     check_message_text = message_text
     # check_message_text = await pre_handle(message_text)
@@ -38,42 +41,44 @@ async def process_forward_rule(client, event, chat_id, rule):
             
             
             if event.message.grouped_id:
-                # 等待一段时间以确保收到所有媒体组消息
-                await asyncio.sleep(1)
-                
-                # 收集媒体组的所有消息
-                messages = []
-                async for message in client.iter_messages(
-                    event.chat_id,
-                    limit=20,  # 限制搜索范围
-                    min_id=event.message.id - 10,
-                    max_id=event.message.id + 10
-                ):
-                    if message.grouped_id == event.message.grouped_id:
-                        messages.append(message.id)
-                        logger.info(f'找到媒体组消息: ID={message.id}')
-                
-                # 按照ID排序，确保转发顺序正确
-                messages.sort()
+                # 使用聚合器收集的媒体组消息（已按ID排序）
+                album = await album_aggregator.wait(client, event.message)
+                messages = album.message_ids
                 
                 # 一次性转发所有消息
-                await client.forward_messages(
+                if send_ticket:
+                    await send_ticket.wait_turn()
+                await send_scheduler.send(
+                    client,
+                    target_chat_id,
+                    client.forward_messages,
                     target_chat_id,
                     messages,
-                    event.chat_id
+                    event.chat_id,
+                    cost=len(messages)
                 )
                 logger.info(f'[用户] 已转发 {len(messages)} 条媒体组消息到: {target_chat.name} ({target_chat_id})')
+                outbox.mark_delivered(rule.id, event.chat_id, event.message.id)
                 
             else:
                 # 处理单条消息
-                await client.forward_messages(
+                if send_ticket:
+                    await send_ticket.wait_turn()
+                await send_scheduler.send(
+                    client,
+                    target_chat_id,
+                    client.forward_messages,
                     target_chat_id,
                     event.message.id,
                     event.chat_id
                 )
                 logger.info(f'[用户] 消息已转发到: {target_chat.name} ({target_chat_id})')
+                outbox.mark_delivered(rule.id, event.chat_id, event.message.id)
                 
                 
         except Exception as e:
             logger.error(f'转发消息时出错: {str(e)}')
-            logger.exception(e) 
\ No newline at end of file
+            logger.exception(e)
+        finally:
+            if send_ticket:
+                send_ticket.release() 
\ No newline at end of file
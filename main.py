@@ -1,4 +1,4 @@
-from telethon import TelegramClient, types
+from telethon import types
 from telethon.tl.types import BotCommand
 from telethon.tl.functions.bots import SetBotCommandsRequest
 from models.models import init_db
@@ -7,7 +7,12 @@ from message_listener import setup_listeners
 import os
 import asyncio
 import logging
+from functools import partial
 from models.db_operations import DBOperations
+from managers.rule_index import rule_index
+from managers.outbox_manager import outbox
+from handlers.outbox_handler import resume_outbox_entry
+from utils.coalescing_client import CoalescingTelegramClient
 from scheduler.summary_scheduler import SummaryScheduler
 
 logger = logging.getLogger(__name__)
@@ -46,13 +51,16 @@ def clear_temp_dir():
         os.remove(os.path.join('./temp', file))
 
 
-# 创建客户端
-user_client = TelegramClient('./sessions/user', api_id, api_hash)
-bot_client = TelegramClient('./sessions/bot', api_id, api_hash)
+# 创建客户端（相同的并发读请求只发出一次）
+user_client = CoalescingTelegramClient('./sessions/user', api_id, api_hash)
+bot_client = CoalescingTelegramClient('./sessions/bot', api_id, api_hash)
 
 # 初始化数据库
 engine = init_db()
 
+# 加载转发规则索引
+rule_index.reload()
+
 # 设置消息监听器
 setup_listeners(user_client, bot_client)
 
@@ -73,6 +81,9 @@ async def start_clients():
         me_bot = await bot_client.get_me()
         print(f'机器人客户端已启动: {me_bot.first_name} (@{me_bot.username})')
 
+        # 启动发件箱，恢复上次未完成的转发
+        outbox.start(partial(resume_outbox_entry, user_client=user_client, bot_client=bot_client))
+
         # 注册命令
         await register_bot_commands(bot_client)
 
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import logging
+import re
+
+from ai import ai_executor
+from utils.constants import AI_BATCH_WINDOW, AI_BATCH_MAX_SIZE
+
+logger = logging.getLogger(__name__)
+
+# 批量请求附加在提示词后的说明
+BATCH_INSTRUCTION = """
+
+接下来会收到一个 JSON 数组，每个元素包含 id 和 text。请对每个元素的 text 分别按照上面的要求处理，\
+只输出一个 JSON 数组，每个元素包含原来的 id 和处理结果 result，不要输出其他任何内容。"""
+
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+def build_batch_message(messages):
+    """将多条消息组合为一个批量请求的内容"""
+    return json.dumps([{'id': i, 'text': message} for i, message in enumerate(messages)], ensure_ascii=False)
+
+
+def parse_batch_output(output, count):
+    """
+    解析批量请求的输出
+
+    Returns:
+        dict: 消息序号 -> 处理结果，只包含能够解析的条目
+    """
+    if not output:
+        return {}
+    text = _CODE_FENCE.sub('', output.strip())
+    start, end = text.find('['), text.rfind(']')
+    if start < 0 or end < start:
+        return {}
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    results = {}
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('result'), str):
+            continue
+        try:
+            index = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= index < count:
+            results[index] = item['result']
+    return results
+
+
+class _Batch:
+    """收集中的一批消息"""
+
+    __slots__ = ('items', 'timer')
+
+    def __init__(self):
+        # (消息内容, 等待结果的 Future)
+        self.items = []
+        self.timer = None
+
+
+class AIBatcher:
+    """
+    AI请求批处理
+
+    在 AI_BATCH_WINDOW 秒内收集模型和提示词相同的消息，作为一个 JSON 数组一次发送，
+    要求模型返回按 id 对应的 JSON 数组，再把每条结果分发给等待的规则。
+    输出无法解析或缺少某些条目时，这些消息单独再请求一次；批量请求本身失败时，
+    所有消息都以同一个错误结束
+    """
+
+    def __init__(self, window=AI_BATCH_WINDOW, max_size=AI_BATCH_MAX_SIZE):
+        self._window = window
+        self._max_size = max_size
+        # (模型, 提示词, 备用模型) -> 收集中的批次
+        self._batches = {}
+        self._tasks = set()
+
+    @property
+    def enabled(self):
+        return self._window > 0 and self._max_size > 1
+
+    async def submit(self, model, prompt, message, fallback_model=None):
+        """
+        提交一条消息，等待所在批次处理完成
+
+        Args:
+            model: 模型名称
+            prompt: 提示词（不能包含消息内容）
+            message: 消息内容
+            fallback_model: 主模型失败时使用的备用模型
+
+        Returns:
+            str: 这条消息的处理结果
+        """
+        loop = asyncio.get_running_loop()
+        key = (model, prompt, fallback_model)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = _Batch()
+            batch.timer = loop.call_later(self._window, self._flush, key)
+
+        future = loop.create_future()
+        batch.items.append((message, future))
+        if len(batch.items) >= self._max_size:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        batch = self._batches.pop(key, None)
+        if batch is None:
+            return
+        batch.timer.cancel()
+        task = asyncio.create_task(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key, batch):
+        model, prompt, fallback_model = key
+        # 等待期间已取消的消息不再处理
+        items = [(message, future) for message, future in batch.items if not future.done()]
+        if len(items) <= 1:
+            await asyncio.gather(*(self._process_single(key, *item) for item in items))
+            return
+
+        try:
+            output = await ai_executor.process_message(
+                model,
+                build_batch_message([message for message, _ in items]),
+                prompt=prompt + BATCH_INSTRUCTION,
+                fallback_model=fallback_model
+            )
+        except Exception as e:
+            logger.error(f'批量AI请求失败: {str(e)}')
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        results = parse_batch_output(output, len(items))
+
+        fallback = []
+        for index, (message, future) in enumerate(items):
+            if index in results:
+                if not future.done():
+                    future.set_result(results[index])
+            else:
+                fallback.append((message, future))
+
+        logger.info(f'批量处理 {len(items)} 条消息（模型 {model}），{len(fallback)} 条需要单独处理')
+        await asyncio.gather(*(self._process_single(key, *item) for item in fallback))
+
+    async def _process_single(self, key, message, future):
+        if future.done():
+            return
+        model, prompt, fallback_model = key
+        try:
+            result = await ai_executor.process_message(model, message, prompt=prompt, fallback_model=fallback_model)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+
+# 创建全局实例
+ai_batcher = AIBatcher()
@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from functools import partial
+
+from sqlalchemy import func, select
+
+from models.models import get_session, AICacheEntry
+from utils.constants import AI_CACHE_TTL, AI_CACHE_MAX_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+# 每写入多少个条目检查一次过期和超出上限的条目
+EVICT_INTERVAL = 100
+
+
+def make_cache_key(model, prompt, message):
+    """根据模型、渲染后的提示词和消息内容生成缓存键"""
+    payload = json.dumps([model, prompt or '', message], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AICache:
+    """
+    AI处理结果缓存
+
+    以 (模型, 渲染后的提示词, 消息内容) 的哈希为键保存在数据库中，多个频道转发的相同内容、
+    多条规则使用相同提示词处理同一条消息时只调用一次AI。条目超过 AI_CACHE_TTL 秒后失效，
+    数量超过 AI_CACHE_MAX_ENTRIES 时删除最久未使用的条目。相同键的并发请求共用一次调用
+    """
+
+    def __init__(self, ttl=AI_CACHE_TTL, max_entries=AI_CACHE_MAX_ENTRIES):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        # 缓存键 -> 正在进行的AI处理任务
+        self._inflight = {}
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self._ttl > 0 and self._max_entries > 0
+
+    async def get_or_process(self, model, prompt, message, process):
+        """
+        获取缓存的处理结果，没有缓存时调用 process 并缓存结果
+
+        Args:
+            model: 模型名称
+            prompt: 渲染后的提示词
+            message: 消息内容
+            process: 没有缓存时调用的协程函数，返回处理结果，失败时抛出异常（不缓存）
+
+        Returns:
+            str: 处理结果
+        """
+        if not self.enabled:
+            return await process()
+
+        key = make_cache_key(model, prompt, message)
+        result = self._get(key)
+        if result is not None:
+            self.hits += 1
+            logger.info(f'命中AI处理结果缓存（模型 {model}，命中率 {self.hit_rate:.1%}）')
+            return result
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = self._inflight[key] = asyncio.ensure_future(self._process(key, model, process))
+            task.add_done_callback(partial(self._process_done, key))
+        else:
+            # 相同内容正在处理中，等待同一个结果，同样不产生新的AI调用
+            self.hits += 1
+            logger.info(f'相同内容的AI处理正在进行中，共用处理结果（模型 {model}）')
+
+        # 处理任务由所有调用者共享，单个调用者被取消不影响其他调用者
+        return await asyncio.shield(task)
+
+    async def _process(self, key, model, process):
+        result = await process()
+        if result:
+            self._set(key, model, result)
+        return result
+
+    def _process_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出异常，所有调用者都已取消时不会产生未处理异常的警告
+        if not task.cancelled():
+            task.exception()
+
+    def _get(self, key):
+        now = time.time()
+        session = get_session()
+        try:
+            entry = session.get(AICacheEntry, key)
+            if entry is None or entry.created_at < now - self._ttl:
+                return None
+            entry.hits += 1
+            entry.accessed_at = now
+            response = entry.response
+            session.commit()
+            return response
+        except Exception as e:
+            session.rollback()
+            logger.error(f'读取AI处理结果缓存失败: {str(e)}')
+            return None
+        finally:
+            session.close()
+
+    def _set(self, key, model, response):
+        now = time.time()
+        session = get_session()
+        try:
+            session.merge(AICacheEntry(
+                key=key,
+                model=model,
+                response=response,
+                hits=0,
+                created_at=now,
+                accessed_at=now
+            ))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f'写入AI处理结果缓存失败: {str(e)}')
+            return
+        finally:
+            session.close()
+
+        self._writes += 1
+        if self._writes % EVICT_INTERVAL == 1:
+            self.evict()
+
+    def evict(self):
+        """删除过期条目，以及超出上限的最久未使用的条目"""
+        session = get_session()
+        try:
+            expired = session.query(AICacheEntry).filter(
+                AICacheEntry.created_at < time.time() - self._ttl
+            ).delete(synchronize_session=False)
+
+            overflow = session.query(func.count(AICacheEntry.key)).scalar() - self._max_entries
+            evicted = 0
+            if overflow > 0:
+                oldest = select(AICacheEntry.key).order_by(AICacheEntry.accessed_at).limit(overflow)
+                evicted = session.query(AICacheEntry).filter(
+                    AICacheEntry.key.in_(oldest)
+                ).delete(synchronize_session=False)
+            session.commit()
+            if expired or evicted:
+                logger.info(f'AI处理结果缓存已删除 {expired} 个过期条目、{evicted} 个最久未使用的条目')
+        except Exception as e:
+            session.rollback()
+            logger.error(f'清理AI处理结果缓存失败: {str(e)}')
+        finally:
+            session.close()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def metrics(self):
+        """获取缓存命中统计"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'inflight': len(self._inflight),
+        }
+
+
+# 创建全局实例
+ai_cache = AICache()
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+
+from utils.constants import ALBUM_QUIET_PERIOD, ALBUM_TTL
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class Album:
+    """
+    媒体组，包含同一 grouped_id 下收到的全部消息
+
+    所有规则和过滤器共用同一个对象，不需要再查询聊天记录
+    """
+
+    def __init__(self, chat_id, grouped_id, messages=()):
+        self.chat_id = chat_id
+        self.grouped_id = grouped_id
+        self._messages = {message.id: message for message in messages}
+        self._completed = asyncio.get_running_loop().create_future()
+
+    def add(self, message):
+        self._messages[message.id] = message
+
+    @property
+    def messages(self):
+        """按消息ID排序的媒体组消息"""
+        return [self._messages[message_id] for message_id in sorted(self._messages)]
+
+    @property
+    def message_ids(self):
+        return sorted(self._messages)
+
+    @property
+    def caption_message(self):
+        """带文本的消息（媒体组的说明文字只在其中一条消息上）"""
+        for message in self.messages:
+            if message.text:
+                return message
+        return None
+
+    @property
+    def completed(self):
+        return self._completed.done()
+
+    def complete(self):
+        if not self._completed.done():
+            self._completed.set_result(self)
+
+    async def wait(self):
+        """等待媒体组收集完成"""
+        return await asyncio.shield(self._completed)
+
+    def replace(self, messages):
+        """使用重新获取的消息创建新的媒体组，已删除的消息不再包含在内"""
+        album = Album(self.chat_id, self.grouped_id, [message for message in messages if message])
+        album.complete()
+        return album
+
+
+class AlbumAggregator:
+    """
+    媒体组聚合器
+
+    监听器收到的媒体组消息按 grouped_id 缓存，最后一条消息到达后
+    ALBUM_QUIET_PERIOD 秒内没有新消息即视为收集完成，收集完成的媒体组
+    保留 ALBUM_TTL 秒，期间迟到的消息会被忽略
+    """
+
+    MAX_COMPLETED = 5000
+
+    def __init__(self, quiet_period=ALBUM_QUIET_PERIOD, ttl=ALBUM_TTL):
+        self._quiet_period = quiet_period
+        # 收集中的媒体组
+        self._albums = {}
+        self._last_update = {}
+        # 收集完成的媒体组
+        self._completed = TTLCache(ttl=ttl, maxsize=self.MAX_COMPLETED, name='媒体组缓存')
+
+    @staticmethod
+    def _key(message):
+        return message.chat_id, message.grouped_id
+
+    def add(self, message):
+        """
+        添加收到的媒体组消息
+
+        Returns:
+            bool: 是否是该媒体组的第一条消息
+        """
+        key = self._key(message)
+        loop = asyncio.get_running_loop()
+        if key in self._completed:
+            logger.warning(f'媒体组 {message.grouped_id} 已处理，忽略迟到的消息 {message.id}')
+            return False
+
+        album = self._albums.get(key)
+        if album is not None:
+            album.add(message)
+            self._last_update[key] = loop.time()
+            return False
+
+        self._albums[key] = Album(message.chat_id, message.grouped_id, [message])
+        self._last_update[key] = loop.time()
+        loop.call_later(self._quiet_period, self._check_quiet, key)
+        return True
+
+    def _check_quiet(self, key):
+        album = self._albums.get(key)
+        if album is None:
+            return
+        loop = asyncio.get_running_loop()
+        remaining = self._last_update[key] + self._quiet_period - loop.time()
+        if remaining > 0:
+            loop.call_later(remaining, self._check_quiet, key)
+            return
+
+        del self._last_update[key]
+        del self._albums[key]
+        self._completed.set(key, album)
+        album.complete()
+        logger.info(f'媒体组 {album.grouped_id} 收集完成，共 {len(album.message_ids)} 条消息')
+
+    def get(self, message):
+        """获取已收集完成的媒体组，不存在时返回 None"""
+        return self._completed.get(self._key(message))
+
+    async def wait(self, client, message):
+        """
+        等待消息所在的媒体组收集完成
+
+        不是经由监听器收到的媒体组（例如从磁盘恢复的消息）会查询一次聊天记录
+        """
+        key = self._key(message)
+        album = self._completed.get(key) or self._albums.get(key)
+        if album is not None:
+            return await album.wait()
+        return await self.fetch(client, message)
+
+    async def fetch(self, client, message):
+        """从聊天记录中查找媒体组的全部消息"""
+        messages = []
+        try:
+            async for item in client.iter_messages(
+                message.chat_id,
+                limit=20,
+                min_id=message.id - 10,
+                max_id=message.id + 10
+            ):
+                if item.grouped_id == message.grouped_id:
+                    messages.append(item)
+        except Exception as e:
+            logger.error(f'查询媒体组消息时出错: {str(e)}')
+            messages.append(message)
+
+        key = self._key(message)
+        album = self._completed.get(key)
+        if album is None:
+            album = Album(message.chat_id, message.grouped_id, messages)
+            album.complete()
+            self._completed.set(key, album)
+        return album
+
+
+# 创建全局实例
+album_aggregator = AlbumAggregator()
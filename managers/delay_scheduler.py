@@ -0,0 +1,129 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+
+from utils.constants import DELAY_TICK
+
+logger = logging.getLogger(__name__)
+
+# get_messages 每次最多获取的消息数
+MAX_IDS_PER_REQUEST = 100
+
+
+class _Waiter:
+    """一个等待延迟结束后重新获取消息的请求"""
+
+    __slots__ = ('client', 'chat_id', 'message_ids', 'future')
+
+    def __init__(self, client, chat_id, message_ids, future):
+        self.client = client
+        self.chat_id = chat_id
+        self.message_ids = message_ids
+        self.future = future
+
+
+class DelayScheduler:
+    """
+    延迟处理调度器
+
+    所有等待中的请求按到期时间保存在堆中，到期时间按 DELAY_TICK 向上取整，
+    由一个后台任务在每个时间点唤醒一次。同一时间点到期的请求按聊天合并，
+    每个聊天每 100 条消息只调用一次 get_messages，获取的消息分发给所有等待的规则
+    """
+
+    def __init__(self, tick=DELAY_TICK):
+        self._tick = tick
+        # (到期时间, 序号, 请求)
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = None
+        self._task = None
+        self._fetch_tasks = set()
+
+    async def refetch_after(self, client, chat_id, message_ids, delay):
+        """
+        等待 delay 秒后重新获取消息
+
+        Args:
+            client: 获取消息的客户端
+            chat_id: 聊天ID
+            message_ids: 消息ID列表
+            delay: 延迟秒数
+
+        Returns:
+            list: 与 message_ids 一一对应的最新消息，已删除的消息为 None
+        """
+        loop = asyncio.get_running_loop()
+        due = loop.time() + delay
+        if self._tick > 0:
+            due = math.ceil(due / self._tick) * self._tick
+        waiter = _Waiter(client, chat_id, list(message_ids), loop.create_future())
+        heapq.heappush(self._heap, (due, next(self._counter), waiter))
+        self._ensure_running()
+        # 新请求比当前等待的时间点更早时，唤醒后台任务重新计算
+        if self._heap[0][2] is waiter:
+            self._wakeup.set()
+        return await waiter.future
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._heap:
+            timeout = self._heap[0][0] - loop.time()
+            if timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = loop.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                waiter = heapq.heappop(self._heap)[2]
+                if not waiter.future.done():
+                    due.append(waiter)
+            if due:
+                # 获取消息期间到期的请求在下一轮处理，不阻塞后台任务
+                task = asyncio.create_task(self._fetch(due))
+                self._fetch_tasks.add(task)
+                task.add_done_callback(self._fetch_tasks.discard)
+
+    async def _fetch(self, waiters):
+        """按聊天合并到期的请求并获取消息"""
+        groups = {}
+        for waiter in waiters:
+            groups.setdefault((id(waiter.client), waiter.chat_id), []).append(waiter)
+        await asyncio.gather(*(self._fetch_chat(group) for group in groups.values()))
+
+    async def _fetch_chat(self, waiters):
+        client = waiters[0].client
+        chat_id = waiters[0].chat_id
+        ids = sorted({message_id for waiter in waiters for message_id in waiter.message_ids})
+        messages = {}
+        try:
+            for start in range(0, len(ids), MAX_IDS_PER_REQUEST):
+                chunk = ids[start:start + MAX_IDS_PER_REQUEST]
+                result = await client.get_messages(chat_id, ids=chunk)
+                messages.update((message_id, message) for message_id, message in zip(chunk, result))
+            logger.info(f'延迟结束，聊天 {chat_id} 的 {len(ids)} 条消息已重新获取，分发给 {len(waiters)} 个等待的规则')
+        except Exception as e:
+            for waiter in waiters:
+                if not waiter.future.done():
+                    waiter.future.set_exception(e)
+            return
+
+        for waiter in waiters:
+            if not waiter.future.done():
+                waiter.future.set_result([messages.get(message_id) for message_id in waiter.message_ids])
+
+
+# 创建全局实例
+delay_scheduler = DelayScheduler()
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from utils.constants import FORWARD_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+
+class WorkSlot:
+    """转发任务占用的并发名额，等待期间可以暂时让出"""
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._held = False
+
+    async def acquire(self):
+        await self._semaphore.acquire()
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def suspended(self):
+        """在 with 块内让出名额，结束后重新获取"""
+        held = self._held
+        self.release()
+        try:
+            yield
+        finally:
+            if held:
+                await self.acquire()
+
+
+class SendTicket:
+    """
+    目标聊天的发送顺序凭证
+
+    同一目标聊天的凭证按预约顺序排队，发送前等待前一个凭证释放，
+    发送完成（或放弃发送）后释放自己
+    """
+
+    def __init__(self, sequencer, target_chat_id, previous, done):
+        self._sequencer = sequencer
+        self.target_chat_id = target_chat_id
+        self._previous = previous
+        self._done = done
+        self._released = False
+        # 持有凭证的任务的并发名额，由分发器设置
+        self.slot = None
+
+    async def wait_turn(self):
+        """等待同一目标聊天中之前的消息全部发送完成，等待期间让出并发名额"""
+        if self._previous is not None and not self._previous.done():
+            async with self.idle():
+                await asyncio.shield(self._previous)
+
+    @asynccontextmanager
+    async def idle(self):
+        """
+        在 with 块内让出并发名额，用于延迟等待等不占用资源的等待
+
+        持有名额的任务都在实际处理消息，不会等待其他任务，因此名额不会被互相等待的任务占满
+        """
+        if self.slot is None:
+            yield
+            return
+        async with self.slot.suspended():
+            yield
+
+    def release(self):
+        """释放凭证，可重复调用"""
+        if self._released:
+            return
+        self._released = True
+        # 提前释放的凭证要等前面的凭证都完成后才算完成，保证后续消息不会越过前面的消息
+        if self._previous is None or self._previous.done():
+            self._finish()
+        else:
+            self._previous.add_done_callback(lambda _: self._finish())
+
+    def _finish(self):
+        if not self._done.done():
+            self._done.set_result(None)
+        self._sequencer._discard(self.target_chat_id, self._done)
+
+
+class TargetSequencer:
+    """按目标聊天分配发送顺序凭证"""
+
+    def __init__(self):
+        self._tails = {}
+
+    def reserve(self, target_chat_id):
+        """为目标聊天预约下一个发送位置"""
+        done = asyncio.get_running_loop().create_future()
+        previous = self._tails.get(target_chat_id)
+        self._tails[target_chat_id] = done
+        return SendTicket(self, target_chat_id, previous, done)
+
+    def _discard(self, target_chat_id, done):
+        if self._tails.get(target_chat_id) is done:
+            del self._tails[target_chat_id]
+
+
+class ForwardDispatcher:
+    """
+    转发规则分发器
+
+    同一条消息的多条规则并发执行，正在处理消息的规则数受 FORWARD_CONCURRENCY 限制，
+    延迟等待、编辑等待和等待目标聊天中更早的消息时让出名额，不计入限制；
+    发往同一目标聊天的消息通过 SendTicket 按源消息顺序发送。
+    等待名额的规则达到 FORWARD_CONCURRENCY 条时 dispatch 才会等待，由此反压到入口队列
+    """
+
+    def __init__(self, concurrency=FORWARD_CONCURRENCY):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # 已创建但还没有拿到名额的任务数限制
+        self._admission = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self.sequencer = TargetSequencer()
+
+    async def dispatch(self, jobs):
+        """
+        分发一条消息的所有规则
+
+        Args:
+            jobs: (规则, 处理函数, 参数元组) 的列表，处理函数需接受 send_ticket 关键字参数
+
+        Returns:
+            list: 创建的任务列表
+        """
+        # 凭证在同一次同步调用中预约，保证同一目标聊天按源消息顺序发送
+        tickets = [self.sequencer.reserve(rule.target_chat.telegram_chat_id) for rule, _, _ in jobs]
+        tasks = []
+        for ticket, (rule, process, args) in zip(tickets, jobs):
+            try:
+                await self._admission.acquire()
+            except asyncio.CancelledError:
+                # 未创建任务的凭证需要释放，否则同一目标聊天的后续消息会一直等待
+                for unused in tickets[len(tasks):]:
+                    unused.release()
+                raise
+            task = asyncio.create_task(self._run(rule, ticket, process, args))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            tasks.append(task)
+        return tasks
+
+    async def _run(self, rule, ticket, process, args):
+        slot = ticket.slot = WorkSlot(self._semaphore)
+        try:
+            try:
+                await slot.acquire()
+            finally:
+                self._admission.release()
+            return await process(*args, send_ticket=ticket)
+        except Exception as e:
+            logger.error(f'处理规则 {rule.id} 时发生错误: {str(e)}')
+            logger.exception(e)
+        finally:
+            ticket.release()
+            slot.release()
+
+
+# 创建全局实例
+forward_dispatcher = ForwardDispatcher()
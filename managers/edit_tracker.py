@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from collections import deque
+
+from managers.delay_scheduler import delay_scheduler
+from utils.constants import DELAY_EDIT_MIN_TIMEOUT, DELAY_EDIT_MIN_SAMPLES
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# 超时时间为观察到的编辑延迟的 95 分位数乘以该系数
+TIMEOUT_MARGIN = 1.5
+# 每个聊天保留的编辑延迟样本数
+MAX_LATENCY_SAMPLES = 50
+# 收到的编辑保留时间（秒），编辑早于延迟处理开始时仍然可以使用
+EDIT_TTL = 300
+
+
+class _ChatStats:
+    """聊天的编辑统计"""
+
+    __slots__ = ('messages', 'latencies')
+
+    def __init__(self):
+        self.messages = 0
+        self.latencies = deque(maxlen=MAX_LATENCY_SAMPLES)
+
+
+class EditTracker:
+    """
+    基于编辑事件的延迟处理
+
+    监听延迟处理的源聊天的消息编辑事件，等待中的消息一旦被编辑立即结束等待，
+    直接使用编辑后的消息；没有编辑时在超时后重新获取一次消息。
+    超时时间根据每个聊天观察到的编辑延迟（编辑时间与发送时间之差）自动调整，
+    不会超过规则设置的延迟秒数；样本不足时使用规则设置的延迟秒数
+    """
+
+    def __init__(self, min_timeout=DELAY_EDIT_MIN_TIMEOUT, min_samples=DELAY_EDIT_MIN_SAMPLES):
+        self._min_timeout = min_timeout
+        self._min_samples = min_samples
+        self._stats = {}
+        # (聊天ID, 消息ID) -> 等待编辑的 Future 集合
+        self._waiters = {}
+        # (聊天ID, 消息ID) -> 编辑后的消息
+        self._edits = TTLCache(ttl=EDIT_TTL, maxsize=5000, name='消息编辑缓存')
+        # 经过延迟处理的消息（媒体组包含所有消息）
+        self._seen = TTLCache(ttl=EDIT_TTL, maxsize=5000, name='延迟消息记录')
+
+    def _get_stats(self, chat_id):
+        stats = self._stats.get(chat_id)
+        if stats is None:
+            stats = self._stats[chat_id] = _ChatStats()
+        return stats
+
+    def on_edit(self, message):
+        """处理收到的消息编辑事件"""
+        if message.edit_date is None:
+            return
+        key = (message.chat_id, message.id)
+        # 只统计经过延迟处理的消息的第一次编辑，旧消息的编辑不计入；
+        # 晚于超时到达的编辑同样计入，之后的超时会相应延长
+        if key in self._seen and key not in self._edits and message.date:
+            latency = (message.edit_date - message.date).total_seconds()
+            self._get_stats(message.chat_id).latencies.append(max(latency, 0))
+            logger.debug(f'聊天 {message.chat_id} 的消息 {message.id} 在发送 {latency:.1f} 秒后被编辑')
+        self._edits.set(key, message)
+
+        for future in self._waiters.pop(key, ()):
+            if not future.done():
+                future.set_result(message)
+
+    def get_timeout(self, chat_id, delay):
+        """获取聊天的等待超时时间"""
+        stats = self._stats.get(chat_id)
+        if stats is None or stats.messages < self._min_samples:
+            return delay
+        if not stats.latencies:
+            # 从未观察到编辑
+            return min(delay, self._min_timeout)
+        latencies = sorted(stats.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return min(delay, max(self._min_timeout, p95 * TIMEOUT_MARGIN))
+
+    async def wait(self, client, chat_id, messages, delay):
+        """
+        等待消息被编辑或超时
+
+        Args:
+            client: 超时后重新获取消息的客户端
+            chat_id: 聊天ID
+            messages: 等待的消息列表（媒体组为所有消息）
+            delay: 规则设置的延迟秒数，最长等待时间
+
+        Returns:
+            list: 与 messages 一一对应的最新消息，已删除的消息为 None
+        """
+        keys = [(chat_id, message.id) for message in messages]
+        if keys[0] not in self._seen:
+            self._get_stats(chat_id).messages += 1
+        for key in keys:
+            self._seen.add(key)
+
+        if not any(key in self._edits for key in keys):
+            timeout = self.get_timeout(chat_id, delay)
+            future = asyncio.get_running_loop().create_future()
+            for key in keys:
+                self._waiters.setdefault(key, set()).add(future)
+            try:
+                await asyncio.wait_for(future, timeout)
+                logger.info(f'聊天 {chat_id} 的消息 {messages[0].id} 已被编辑，结束等待')
+            except asyncio.TimeoutError:
+                logger.info(f'聊天 {chat_id} 的消息 {messages[0].id} 在 {timeout:.1f} 秒内没有编辑，重新获取消息')
+                return await delay_scheduler.refetch_after(client, chat_id, [message.id for message in messages], 0)
+            finally:
+                for key in keys:
+                    futures = self._waiters.get(key)
+                    if futures is not None:
+                        futures.discard(future)
+                        if not futures:
+                            del self._waiters[key]
+
+        # 使用编辑后的消息，媒体组中没有编辑的消息保持不变
+        return [self._edits.get(key) or message for key, message in zip(keys, messages)]
+
+
+# 创建全局实例
+edit_tracker = EditTracker()
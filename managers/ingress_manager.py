@@ -0,0 +1,306 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+
+from utils.constants import (
+    INGRESS_QUEUE_SIZE, INGRESS_WORKERS, INGRESS_OVERFLOW, INGRESS_SPILL_DIR, INGRESS_METRICS_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# 队列溢出策略
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_SPILL = 'spill'
+
+
+class _SpillFile:
+    """源聊天的溢出文件，每行一条 JSON 记录"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._offset = 0
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.count = sum(1 for line in f if line.strip())
+
+    def append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def read(self, limit):
+        """按写入顺序读取最多 limit 条记录，全部读完后删除文件"""
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(self._offset)
+            while len(records) < limit:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    records.append(json.loads(line))
+            self._offset = f.tell()
+
+        self.count -= len(records)
+        if self.count <= 0:
+            self.count = 0
+            self._offset = 0
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logger.error(f'删除溢出文件失败: {str(e)}')
+        return records
+
+
+class _SourceQueue:
+    """单个源聊天的有界队列"""
+
+    def __init__(self, key, maxsize, spill_path):
+        self.key = key
+        # (入队时间, 事件, 溢出记录)
+        self.items = deque()
+        # 从溢出文件读回、尚未处理的记录
+        self.loaded = deque()
+        self.slots = asyncio.Semaphore(maxsize)
+        self.spill = _SpillFile(spill_path)
+        self.scheduled = False
+        # block 策略下等待空位的事件处理任务数
+        self.waiting = 0
+
+    def has_spilled(self):
+        return bool(self.loaded) or self.spill.count > 0
+
+    def __len__(self):
+        return len(self.items) + len(self.loaded) + self.spill.count
+
+
+class IngressQueue:
+    """
+    消息入口队列
+
+    每个源聊天一个有界队列，由固定数量的工作协程处理；同一源聊天的消息
+    同一时间只由一个工作协程按顺序处理，不同源聊天之间轮流调度。
+    队列满时按溢出策略处理：
+        block       - 事件处理任务等待队列有空位
+        drop_oldest - 丢弃该源聊天最早的消息
+        spill       - 写入磁盘，队列空闲后按顺序读回
+
+    Telethon 为每个更新创建单独的任务，block 策略的等待只挂起这些任务，不会减慢更新的接收，
+    挂起的任务仍然持有各自的事件。因此每个源聊天最多挂起 maxsize 个任务，超出后的消息
+    按 spill 策略写入磁盘；没有提供序列化函数时丢弃这些消息
+    """
+
+    def __init__(self, maxsize=INGRESS_QUEUE_SIZE, workers=INGRESS_WORKERS, overflow=INGRESS_OVERFLOW,
+                 spill_dir=INGRESS_SPILL_DIR, metrics_interval=INGRESS_METRICS_INTERVAL):
+        if overflow not in (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_SPILL):
+            logger.warning(f'未知的队列溢出策略: {overflow}，使用 {OVERFLOW_BLOCK}')
+            overflow = OVERFLOW_BLOCK
+
+        self.maxsize = max(1, maxsize)
+        self.workers = max(1, workers)
+        self.overflow = overflow
+        self._spill_dir = spill_dir
+        self._metrics_interval = metrics_interval
+
+        self._sources = {}
+        self._ready = asyncio.Queue()
+        self._tasks = []
+        self._handler = None
+        self._dump = None
+        self._load = None
+        self._drop = None
+
+        self._enqueued = 0
+        self._processed = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def start(self, handler, dump=None, load=None, drop=None):
+        """
+        设置消息处理函数，工作协程在第一条消息入队时启动
+
+        Args:
+            handler: 处理事件的协程函数
+            dump: 将事件转换为可 JSON 序列化记录的函数（spill 策略需要）
+            load: 根据记录重新构建事件的协程函数（spill 策略需要）
+            drop: drop_oldest 策略丢弃事件时调用的函数
+        """
+        if self.overflow == OVERFLOW_SPILL and (dump is None or load is None):
+            logger.warning(f'未提供溢出记录的序列化函数，队列溢出策略改为 {OVERFLOW_BLOCK}')
+            self.overflow = OVERFLOW_BLOCK
+        self._handler = handler
+        self._dump = dump
+        self._load = load
+        self._drop = drop
+
+    def _ensure_workers(self):
+        if self._tasks:
+            return
+        if self._dump is not None and self._load is not None:
+            # block 策略同样可能溢出到磁盘
+            self._recover_spill()
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        if self._metrics_interval > 0:
+            self._tasks.append(asyncio.create_task(self._report_metrics()))
+        logger.info(f'消息入口队列已启动: {self.workers} 个工作协程, 单源容量 {self.maxsize}, 溢出策略 {self.overflow}')
+
+    def _recover_spill(self):
+        """恢复上次运行遗留的溢出消息"""
+        os.makedirs(self._spill_dir, exist_ok=True)
+        for file_name in os.listdir(self._spill_dir):
+            if not file_name.endswith('.jsonl'):
+                continue
+            try:
+                key = int(file_name[:-len('.jsonl')])
+            except ValueError:
+                continue
+            source = self._get_source(key)
+            if len(source):
+                logger.info(f'恢复源聊天 {key} 的 {len(source)} 条溢出消息')
+                self._schedule(source)
+
+    def _get_source(self, key):
+        source = self._sources.get(key)
+        if source is None:
+            spill_path = os.path.join(self._spill_dir, f'{key}.jsonl')
+            source = self._sources[key] = _SourceQueue(key, self.maxsize, spill_path)
+        return source
+
+    def _schedule(self, source):
+        if not source.scheduled:
+            source.scheduled = True
+            self._ready.put_nowait(source)
+
+    async def put(self, key, event):
+        """
+        将事件放入源聊天的队列
+
+        Args:
+            key: 源聊天标识
+            event: 消息事件
+        """
+        self._ensure_workers()
+        source = self._get_source(key)
+        self._enqueued += 1
+
+        if self.overflow == OVERFLOW_SPILL and (source.has_spilled() or source.slots.locked()):
+            # 已有溢出的消息时新消息也写入磁盘，保证处理顺序
+            self._spill(source, event)
+        elif self.overflow == OVERFLOW_BLOCK and (source.has_spilled() or source.waiting >= self.maxsize):
+            # 挂起的事件处理任务过多
+            if self._dump is not None:
+                self._spill(source, event)
+            else:
+                # 丢弃新消息而不是最早的消息，挂起的任务入队后仍然保持原来的顺序
+                self._dropped += 1
+                logger.warning(f'源聊天 {key} 等待入队的消息过多，丢弃新消息')
+                if self._drop is not None:
+                    self._drop(event)
+                return
+        elif self.overflow == OVERFLOW_DROP_OLDEST and source.slots.locked():
+            _, dropped, _ = source.items.popleft()
+            source.items.append((time.time(), event, None))
+            self._dropped += 1
+            logger.warning(f'源聊天 {key} 的队列已满，丢弃最早的消息')
+            if self._drop is not None:
+                self._drop(dropped)
+        else:
+            source.waiting += 1
+            try:
+                await source.slots.acquire()
+            finally:
+                source.waiting -= 1
+            source.items.append((time.time(), event, None))
+
+        self._schedule(source)
+
+    def _spill(self, source, event):
+        os.makedirs(self._spill_dir, exist_ok=True)
+        record = self._dump(event)
+        record['queued_at'] = time.time()
+        source.spill.append(record)
+        self._spilled += 1
+
+    def _pop(self, source):
+        if source.items:
+            item = source.items.popleft()
+            source.slots.release()
+            return item
+        if source.waiting:
+            # 等待入队的消息早于溢出的消息，入队后再读回溢出的消息
+            return None
+        if not source.loaded and source.spill.count:
+            source.loaded.extend(source.spill.read(self.maxsize))
+        if source.loaded:
+            record = source.loaded.popleft()
+            return record.pop('queued_at', time.time()), None, record
+        return None
+
+    async def _worker(self):
+        while True:
+            source = await self._ready.get()
+            item = self._pop(source)
+            if item is None:
+                source.scheduled = False
+                continue
+
+            queued_at, event, record = item
+            try:
+                wait = time.time() - queued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+                if event is None:
+                    event = await self._load(record)
+                if event is not None:
+                    await self._handler(event)
+            except Exception as e:
+                logger.error(f'处理源聊天 {source.key} 的消息时出错: {str(e)}')
+                logger.exception(e)
+            finally:
+                self._processed += 1
+                # 处理完一条后让出，其他源聊天的消息可以得到处理
+                if len(source):
+                    self._ready.put_nowait(source)
+                else:
+                    source.scheduled = False
+
+    def metrics(self):
+        """获取队列指标"""
+        depths = {key: len(source) for key, source in self._sources.items() if len(source)}
+        return {
+            'depth': sum(depths.values()),
+            'waiting': sum(source.waiting for source in self._sources.values()),
+            'source_depths': depths,
+            'enqueued': self._enqueued,
+            'processed': self._processed,
+            'dropped': self._dropped,
+            'spilled': self._spilled,
+            'avg_wait': self._wait_total / self._processed if self._processed else 0.0,
+            'max_wait': self._wait_max,
+        }
+
+    async def _report_metrics(self):
+        last_enqueued = 0
+        while True:
+            await asyncio.sleep(self._metrics_interval)
+            metrics = self.metrics()
+            if metrics['enqueued'] == last_enqueued and not metrics['depth']:
+                continue
+            last_enqueued = metrics['enqueued']
+            logger.info(
+                f"消息入口队列: 积压 {metrics['depth']} 条, 等待入队 {metrics['waiting']} 条, 已处理 {metrics['processed']} 条, "
+                f"丢弃 {metrics['dropped']} 条, 溢出 {metrics['spilled']} 条, "
+                f"平均等待 {metrics['avg_wait']:.3f}s, 最长等待 {metrics['max_wait']:.3f}s"
+            )
+
+
+# 创建全局实例
+ingress_queue = IngressQueue()
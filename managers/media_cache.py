@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict
+
+from utils.constants import TEMP_DIR, MEDIA_CACHE_SIZE_MB, MEDIA_UPLOAD_TTL
+from utils.media import get_media_key, get_uploaded_input_media
+
+logger = logging.getLogger(__name__)
+
+
+class _CacheEntry:
+    """缓存中的一个媒体文件"""
+
+    __slots__ = ('key', 'path', 'size', 'refs', 'task')
+
+    def __init__(self, key):
+        self.key = key
+        self.path = None
+        self.size = 0
+        self.refs = 0
+        self.task = None
+
+
+class MediaCache:
+    """
+    媒体下载缓存，以 Telegram 文档/照片 ID 为键
+
+    同一媒体的并发请求合并为一次下载，每次 acquire 增加引用计数，
+    release 减少引用计数。最后一个使用者释放后文件即被删除；
+    设置了 MEDIA_CACHE_SIZE_MB 时，未被使用的文件会保留下来，
+    总大小超过上限时按最近最少使用的顺序删除
+    """
+
+    def __init__(self, directory=os.path.join(TEMP_DIR, 'media'), max_idle_size=MEDIA_CACHE_SIZE_MB * 1024 * 1024):
+        self._directory = directory
+        self._max_idle_size = max_idle_size
+        self._entries = {}
+        self._paths = {}
+        self._idle = OrderedDict()
+        self._idle_size = 0
+
+    async def acquire(self, message):
+        """
+        获取消息媒体的本地文件，用完后需要调用 release
+
+        Args:
+            message: 包含媒体的消息
+
+        Returns:
+            str: 文件路径，下载失败时返回 None
+        """
+        key = get_media_key(message.media)
+        if key is None:
+            # 无法确定唯一标识的媒体不缓存，直接下载
+            return await message.download_media(TEMP_DIR)
+
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _CacheEntry(key)
+            entry.task = asyncio.create_task(self._download(message, entry))
+        elif entry.refs == 0 and entry.task.done():
+            self._take_idle(entry)
+
+        entry.refs += 1
+        try:
+            # 下载由所有请求共享，单个请求被取消不影响其他请求
+            path = await asyncio.shield(entry.task)
+        except BaseException:
+            self._release_entry(entry)
+            raise
+
+        if path is None:
+            self._release_entry(entry)
+        return path
+
+    def release(self, path):
+        """释放文件，没有其他使用者时删除（或转为闲置缓存）"""
+        if not path:
+            return
+        key = self._paths.get(path)
+        if key is None:
+            self._remove_file(path)
+            return
+        self._release_entry(self._entries[key])
+
+    async def _download(self, message, entry):
+        directory = os.path.join(self._directory, f'{entry.key[0]}_{entry.key[1]}')
+        os.makedirs(directory, exist_ok=True)
+        try:
+            path = await message.download_media(directory)
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        if not path:
+            shutil.rmtree(directory, ignore_errors=True)
+            return None
+
+        entry.path = path
+        entry.size = os.path.getsize(path)
+        self._paths[path] = entry.key
+        logger.info(f'媒体已下载到缓存: {path}')
+        return path
+
+    def _release_entry(self, entry):
+        entry.refs -= 1
+        if entry.refs > 0:
+            return
+
+        if entry.path is None:
+            # 下载失败或尚未完成，下载完成后没有使用者的文件直接删除
+            if entry.task.done():
+                self._drop(entry)
+            else:
+                entry.task.add_done_callback(lambda _: self._drop_unused(entry))
+            return
+
+        if entry.size > self._max_idle_size:
+            self._drop(entry)
+            return
+
+        self._idle[entry.key] = entry
+        self._idle_size += entry.size
+        while self._idle_size > self._max_idle_size:
+            _, oldest = self._idle.popitem(last=False)
+            self._idle_size -= oldest.size
+            self._drop(oldest)
+
+    def _drop_unused(self, entry):
+        if entry.refs == 0:
+            self._drop(entry)
+
+    def _take_idle(self, entry):
+        if self._idle.pop(entry.key, None) is not None:
+            self._idle_size -= entry.size
+
+    def _drop(self, entry):
+        if self._entries.get(entry.key) is entry:
+            del self._entries[entry.key]
+        if entry.path:
+            self._paths.pop(entry.path, None)
+            shutil.rmtree(os.path.dirname(entry.path), ignore_errors=True)
+            logger.info(f'已删除缓存的媒体文件: {entry.path}')
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except Exception as e:
+            logger.error(f'删除临时文件失败: {str(e)}')
+
+
+class MediaUploadCache:
+    """
+    已上传文件缓存，以客户端和 Telegram 文档/照片 ID 为键
+
+    同一媒体只通过 upload_file 上传一次，得到的文件句柄在 MEDIA_UPLOAD_TTL 内
+    复用于所有目标聊天和媒体组，同一媒体的并发上传合并为一次
+    """
+
+    def __init__(self, ttl=MEDIA_UPLOAD_TTL):
+        self._ttl = ttl
+        # (客户端, 媒体标识) -> (过期时间, 上传任务)
+        self._entries = {}
+
+    async def get_input_media(self, client, message, path):
+        """
+        获取可以直接发送的 InputMedia，需要时上传文件
+
+        Args:
+            client: 发送消息的客户端
+            message: 媒体对应的源消息
+            path: 本地文件路径
+
+        Returns:
+            InputMedia，无法确定媒体标识时返回原文件路径
+        """
+        key = get_media_key(message.media)
+        if key is None:
+            return path
+
+        now = time.monotonic()
+        self._prune(now)
+        cache_key = (id(client), key)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            entry = self._entries[cache_key] = (now + self._ttl, asyncio.create_task(client.upload_file(path)))
+            logger.info(f'正在上传媒体文件: {path}')
+
+        try:
+            input_file = await asyncio.shield(entry[1])
+        except Exception:
+            if self._entries.get(cache_key) is entry:
+                del self._entries[cache_key]
+            raise
+        return get_uploaded_input_media(message.media, input_file)
+
+    def discard(self, client, message):
+        """删除失效的文件句柄"""
+        key = get_media_key(message.media)
+        if key is not None:
+            self._entries.pop((id(client), key), None)
+
+    def _prune(self, now):
+        expired = [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+
+# 创建全局实例
+media_cache = MediaCache()
+media_uploads = MediaUploadCache()
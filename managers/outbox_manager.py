@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from sqlalchemy import case
+from sqlalchemy.dialects.sqlite import insert
+
+from models.models import get_session, OutboxEntry
+from utils.constants import OUTBOX_FLUSH_INTERVAL, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETENTION
+
+logger = logging.getLogger(__name__)
+
+# 发件箱条目状态
+STATUS_PENDING = 'pending'  # 等待处理
+STATUS_RENDERED = 'rendered'  # 消息已渲染，正在发送
+STATUS_DELIVERED = 'delivered'  # 已送达
+STATUS_FINISHED = 'finished'  # 处理结束但没有发送（被过滤、出错或不再需要）
+
+UNFINISHED_STATUSES = (STATUS_PENDING, STATUS_RENDERED)
+
+
+@dataclass
+class OutboxRecord:
+    """从发件箱恢复的未完成转发"""
+    rule_id: int
+    source_chat_id: int
+    message_id: int
+    status: str
+    text: Optional[str]
+    media_ids: List[int]
+    attempts: int
+
+
+class Outbox:
+    """
+    持久化的发件箱
+
+    每条消息对每条规则的转发在发件箱中有一个条目，记录其处理状态、渲染后的文本和媒体。
+    状态变化先在内存中合并，由写入协程每隔 OUTBOX_FLUSH_INTERVAL 秒（或积累了
+    OUTBOX_BATCH_SIZE 个条目时）在一个事务中批量提交。启动时按批次恢复未完成的条目，
+    已送达的条目不会重复发送
+    """
+
+    def __init__(self, flush_interval=OUTBOX_FLUSH_INTERVAL, batch_size=OUTBOX_BATCH_SIZE,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS, retention=OUTBOX_RETENTION):
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._retention = retention
+        # (规则ID, 源聊天ID, 消息ID) -> 等待写入的字段
+        self._dirty = {}
+        # (源聊天ID, 消息ID) -> 尚未结束的规则ID
+        self._open = {}
+        self._wakeup = None
+        self._tasks = []
+
+    def start(self, resume):
+        """
+        启动写入协程，并恢复上次未完成的转发
+
+        Args:
+            resume: 处理一条 OutboxRecord 的协程函数
+        """
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._purge()
+        self._tasks.append(asyncio.create_task(self._writer()))
+        self._tasks.append(asyncio.create_task(self._resume_all(resume)))
+
+    def add(self, rule_id, chat_id, message_id):
+        """记录一条待处理的转发"""
+        self._open.setdefault((chat_id, message_id), set()).add(rule_id)
+        self._write((rule_id, chat_id, message_id), status=STATUS_PENDING)
+
+    def mark_rendered(self, rule_id, chat_id, message_id, text, media_ids=()):
+        """记录渲染后的消息文本和需要发送的媒体"""
+        self._write(
+            (rule_id, chat_id, message_id),
+            status=STATUS_RENDERED,
+            text=text,
+            media_ids=json.dumps(list(media_ids))
+        )
+
+    def mark_delivered(self, rule_id, chat_id, message_id):
+        """记录转发已送达"""
+        self._close(rule_id, chat_id, message_id)
+        self._write((rule_id, chat_id, message_id), status=STATUS_DELIVERED)
+
+    def finish(self, rule_id, chat_id, message_id):
+        """记录转发处理结束，已送达的条目保持送达状态"""
+        self._close(rule_id, chat_id, message_id)
+        self._write((rule_id, chat_id, message_id), status=STATUS_FINISHED)
+
+    def finish_message(self, chat_id, message_id, exclude=()):
+        """结束一条消息除 exclude 以外的所有规则的转发"""
+        for rule_id in list(self._open.get((chat_id, message_id), ())):
+            if rule_id not in exclude:
+                self.finish(rule_id, chat_id, message_id)
+
+    def _close(self, rule_id, chat_id, message_id):
+        rule_ids = self._open.get((chat_id, message_id))
+        if rule_ids is not None:
+            rule_ids.discard(rule_id)
+            if not rule_ids:
+                del self._open[(chat_id, message_id)]
+
+    def _write(self, key, **fields):
+        pending = self._dirty.setdefault(key, {})
+        # 送达标记不会被之后的结束标记覆盖
+        if pending.get('status') == STATUS_DELIVERED and fields.get('status') == STATUS_FINISHED:
+            fields.pop('status')
+        pending.update(fields)
+        if self._wakeup is not None and len(self._dirty) >= self._batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """在一个事务中提交所有等待写入的状态变化"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = time.time()
+        session = get_session()
+        try:
+            for (rule_id, chat_id, message_id), fields in dirty.items():
+                stmt = insert(OutboxEntry).values(
+                    rule_id=rule_id,
+                    source_chat_id=chat_id,
+                    message_id=message_id,
+                    created_at=now,
+                    updated_at=now,
+                    **fields
+                )
+                update = {**fields, 'updated_at': now}
+                if 'status' in fields:
+                    update['status'] = case(
+                        (OutboxEntry.status == STATUS_DELIVERED, STATUS_DELIVERED),
+                        else_=stmt.excluded.status
+                    )
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=['rule_id', 'source_chat_id', 'message_id'],
+                    set_=update
+                ))
+            session.commit()
+            logger.debug(f'发件箱已提交 {len(dirty)} 个条目')
+        except Exception as e:
+            session.rollback()
+            logger.error(f'写入发件箱失败: {str(e)}')
+            # 保留未写入的变化，下次重试（期间的新变化优先）
+            for key, fields in dirty.items():
+                self._dirty[key] = {**fields, **self._dirty.get(key, {})}
+        finally:
+            session.close()
+
+    async def _writer(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            self.flush()
+
+    def _purge(self):
+        """删除超过保留时间的已结束条目"""
+        session = get_session()
+        try:
+            deleted = session.query(OutboxEntry).filter(
+                OutboxEntry.status.notin_(UNFINISHED_STATUSES),
+                OutboxEntry.updated_at < time.time() - self._retention
+            ).delete(synchronize_session=False)
+            session.commit()
+            if deleted:
+                logger.info(f'已清理 {deleted} 个已结束的发件箱条目')
+        except Exception as e:
+            session.rollback()
+            logger.error(f'清理发件箱失败: {str(e)}')
+        finally:
+            session.close()
+
+    def _load_unfinished(self, after_id):
+        session = get_session()
+        try:
+            entries = session.query(OutboxEntry).filter(
+                OutboxEntry.status.in_(UNFINISHED_STATUSES),
+                OutboxEntry.id > after_id
+            ).order_by(OutboxEntry.id).limit(self._batch_size).all()
+            return [
+                (entry.id, OutboxRecord(
+                    rule_id=entry.rule_id,
+                    source_chat_id=entry.source_chat_id,
+                    message_id=entry.message_id,
+                    status=entry.status,
+                    text=entry.text,
+                    media_ids=json.loads(entry.media_ids) if entry.media_ids else [],
+                    attempts=entry.attempts
+                ))
+                for entry in entries
+            ]
+        finally:
+            session.close()
+
+    async def _resume_all(self, resume):
+        """按批次恢复上次未完成的转发"""
+        last_id = 0
+        total = 0
+        while True:
+            try:
+                batch = self._load_unfinished(last_id)
+            except Exception as e:
+                logger.error(f'读取发件箱失败: {str(e)}')
+                return
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            records = []
+            for _, record in batch:
+                key = (record.rule_id, record.source_chat_id, record.message_id)
+                if record.attempts >= self._max_attempts:
+                    logger.warning(f'转发 {key} 已恢复 {record.attempts} 次仍未完成，放弃')
+                    self.finish(*key)
+                    continue
+                self._write(key, attempts=record.attempts + 1)
+                records.append(record)
+            # 先提交恢复次数，恢复过程中再次重启时不会无限重试
+            self.flush()
+            await asyncio.gather(*(self._resume_one(resume, record) for record in records))
+            total += len(records)
+        if total:
+            logger.info(f'已恢复 {total} 个未完成的转发')
+
+    async def _resume_one(self, resume, record):
+        try:
+            await resume(record)
+        except Exception as e:
+            logger.error(f'恢复转发 (规则 {record.rule_id}, 消息 {record.message_id}) 时出错: {str(e)}')
+
+
+# 创建全局实例
+outbox = Outbox()
@@ -0,0 +1,202 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from telethon.utils import get_peer_id, resolve_id
+from telethon.tl.types import PeerChannel, Channel, Chat, User
+
+from utils.constants import PEER_CACHE_PATH, PEER_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+# 缓存变化后延迟写入磁盘的时间（秒），短时间内的多次变化只写入一次
+SAVE_DELAY = 5
+
+
+@dataclass
+class PeerInfo:
+    """聊天的基本信息"""
+    # 带标记的 peer ID（频道为 -100 前缀，普通群组为负数）
+    peer_id: int
+    is_broadcast: bool = False
+    username: Optional[str] = None
+    title: Optional[str] = None
+    updated_at: float = 0
+
+    @property
+    def id(self):
+        """不带标记的聊天ID"""
+        return resolve_id(self.peer_id)[0]
+
+    @property
+    def is_channel(self):
+        return resolve_id(self.peer_id)[1] is PeerChannel
+
+    @classmethod
+    def from_entity(cls, entity):
+        if isinstance(entity, Channel):
+            return cls(
+                peer_id=get_peer_id(entity),
+                is_broadcast=bool(entity.broadcast),
+                username=entity.username,
+                title=entity.title,
+                updated_at=time.time()
+            )
+        if isinstance(entity, Chat):
+            return cls(peer_id=get_peer_id(entity), title=entity.title, updated_at=time.time())
+        if isinstance(entity, User):
+            return cls(
+                peer_id=get_peer_id(entity),
+                username=entity.username,
+                title=' '.join(filter(None, (entity.first_name, entity.last_name))) or None,
+                updated_at=time.time()
+            )
+        return None
+
+
+def resolve_peer(peer):
+    """
+    从消息的 peer 解析聊天ID，不需要任何网络请求
+
+    Args:
+        peer: PeerUser / PeerChat / PeerChannel
+
+    Returns:
+        tuple: (不带标记的聊天ID, 是否是频道)
+    """
+    return get_peer_id(peer, add_mark=False), isinstance(peer, PeerChannel)
+
+
+class PeerCache:
+    """
+    聊天信息缓存
+
+    以带标记的 peer ID 为键缓存聊天的频道标记、用户名和标题，并保存到磁盘，
+    重启后仍然有效。超过 PEER_CACHE_TTL 的条目在下次使用时刷新，
+    同一聊天的并发刷新只发出一次 API 请求
+    """
+
+    def __init__(self, path=PEER_CACHE_PATH, ttl=PEER_CACHE_TTL):
+        self._path = path
+        self._ttl = ttl
+        self._peers = None
+        self._usernames = {}
+        # 键 -> 正在进行的 get_entity 任务
+        self._pending = {}
+        self._save_handle = None
+
+    def _ensure_loaded(self):
+        if self._peers is not None:
+            return
+        self._peers = {}
+        if not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for item in data.get('peers', []):
+                self._add(PeerInfo(**item))
+            logger.info(f'已加载 {len(self._peers)} 个缓存的聊天信息')
+        except Exception as e:
+            logger.error(f'加载聊天信息缓存失败: {str(e)}')
+
+    def _add(self, info):
+        old = self._peers.get(info.peer_id)
+        if old and old.username:
+            self._usernames.pop(old.username.lower(), None)
+        self._peers[info.peer_id] = info
+        if info.username:
+            self._usernames[info.username.lower()] = info.peer_id
+
+    def get(self, peer_id):
+        """获取缓存的聊天信息，不发出网络请求，不存在时返回 None"""
+        self._ensure_loaded()
+        return self._peers.get(int(peer_id))
+
+    def remember(self, entity):
+        """使用已获取的聊天实体（例如更新中附带的实体）更新缓存"""
+        info = PeerInfo.from_entity(entity)
+        if info is None:
+            return None
+        self._ensure_loaded()
+        old = self._peers.get(info.peer_id)
+        self._add(info)
+        # 只有新增、变化或刷新了过期的条目时才需要写入磁盘
+        if old is None or not self._is_fresh(old) or \
+                (old.username, old.title, old.is_broadcast) != (info.username, info.title, info.is_broadcast):
+            self._schedule_save()
+        return info
+
+    def _is_fresh(self, info):
+        return time.time() - info.updated_at < self._ttl
+
+    async def get_info(self, client, peer_id):
+        """
+        获取聊天信息，缓存不存在或已过期时通过 get_entity 刷新
+
+        刷新失败时返回过期的缓存；没有缓存时抛出异常
+        """
+        peer_id = int(peer_id)
+        info = self.get(peer_id)
+        if info is not None and self._is_fresh(info):
+            return info
+        try:
+            return await self._refresh(client, peer_id, peer_id)
+        except Exception as e:
+            if info is None:
+                raise
+            logger.warning(f'刷新聊天 {peer_id} 的信息失败，使用缓存: {str(e)}')
+            return info
+
+    async def resolve_username(self, client, username):
+        """按用户名获取聊天信息，用户名已缓存时不发出网络请求"""
+        username = username.lstrip('@')
+        self._ensure_loaded()
+        peer_id = self._usernames.get(username.lower())
+        if peer_id is not None:
+            info = self._peers[peer_id]
+            if self._is_fresh(info):
+                return info
+        return await self._refresh(client, ('username', username.lower()), username)
+
+    async def _refresh(self, client, key, target):
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.create_task(client.get_entity(target))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # 请求由所有等待者共享，单个等待者被取消不影响其他等待者
+        entity = await asyncio.shield(task)
+        info = self.remember(entity)
+        if info is None:
+            raise ValueError(f'不支持的聊天类型: {type(entity).__name__}')
+        return info
+
+    def _schedule_save(self):
+        if self._save_handle is not None:
+            return
+        try:
+            self._save_handle = asyncio.get_running_loop().call_later(SAVE_DELAY, self.save)
+        except RuntimeError:
+            self.save()
+
+    def save(self):
+        """将缓存写入磁盘"""
+        self._save_handle = None
+        if self._peers is None:
+            return
+        tmp_path = self._path + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'peers': [asdict(info) for info in self._peers.values()]}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path)
+        except Exception as e:
+            logger.error(f'保存聊天信息缓存失败: {str(e)}')
+
+
+# 创建全局实例
+peer_cache = PeerCache()
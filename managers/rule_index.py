@@ -0,0 +1,255 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from itertools import chain
+from typing import Dict, FrozenSet, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import joinedload, selectinload
+from telethon.utils import get_peer_id
+from telethon.tl.types import PeerUser, PeerChat, PeerChannel
+
+from enums.enums import ForwardMode, PreviewMode, MessageMode, AddMode, HandleMode
+from models.models import Session, get_session, Chat, ForwardRule, Keyword, ReplaceRule
+from utils.keyword_matcher import update_source_matchers
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChatSnapshot:
+    """聊天的只读快照"""
+    id: int
+    telegram_chat_id: str
+    name: Optional[str]
+
+    @classmethod
+    def from_model(cls, chat):
+        return cls(id=chat.id, telegram_chat_id=chat.telegram_chat_id, name=chat.name)
+
+
+@dataclass(frozen=True)
+class KeywordSnapshot:
+    """关键字的只读快照"""
+    keyword: Optional[str]
+    is_regex: bool
+    is_blacklist: bool
+
+    @classmethod
+    def from_model(cls, keyword):
+        return cls(keyword=keyword.keyword, is_regex=keyword.is_regex, is_blacklist=keyword.is_blacklist)
+
+
+@dataclass(frozen=True)
+class ReplaceRuleSnapshot:
+    """替换规则的只读快照"""
+    pattern: str
+    content: Optional[str]
+
+    @classmethod
+    def from_model(cls, replace_rule):
+        return cls(pattern=replace_rule.pattern, content=replace_rule.content)
+
+
+@dataclass(frozen=True)
+class RuleSnapshot:
+    """
+    转发规则的只读快照，包含目标聊天、关键字和替换规则，
+    处理消息时无需再访问数据库
+    """
+    id: int
+    source_chat_id: int
+    target_chat_id: int
+    forward_mode: ForwardMode
+    use_bot: bool
+    message_mode: MessageMode
+    is_replace: bool
+    is_preview: PreviewMode
+    is_original_link: bool
+    is_ufb: bool
+    ufb_domain: Optional[str]
+    ufb_item: Optional[str]
+    is_delete_original: bool
+    is_original_sender: bool
+    is_original_time: bool
+    add_mode: AddMode
+    enable_rule: bool
+    is_filter_user_info: bool
+    handle_mode: HandleMode
+    enable_comment_button: bool
+    is_ai: bool
+    ai_model: Optional[str]
+    ai_fallback_model: Optional[str]
+    ai_prompt: Optional[str]
+    is_summary: bool
+    summary_time: Optional[str]
+    summary_prompt: Optional[str]
+    is_keyword_after_ai: bool
+    enable_ai_cache: bool
+    is_top_summary: bool
+    enable_delay: bool
+    delay_seconds: int
+    source_chat: ChatSnapshot
+    target_chat: ChatSnapshot
+    keywords: Tuple[KeywordSnapshot, ...]
+    replace_rules: Tuple[ReplaceRuleSnapshot, ...]
+
+    @classmethod
+    def from_model(cls, rule):
+        """从已加载关联对象的 ForwardRule 创建快照"""
+        columns = {column.key: getattr(rule, column.key) for column in ForwardRule.__table__.columns}
+        return cls(
+            source_chat=ChatSnapshot.from_model(rule.source_chat),
+            target_chat=ChatSnapshot.from_model(rule.target_chat),
+            keywords=tuple(KeywordSnapshot.from_model(k) for k in rule.keywords),
+            replace_rules=tuple(ReplaceRuleSnapshot.from_model(r) for r in rule.replace_rules),
+            **columns
+        )
+
+
+def get_marked_peer_ids(telegram_chat_id):
+    """
+    获取聊天ID可能对应的所有带标记的 peer ID（即事件中的 chat_id）
+
+    数据库中保存的是不带标记的正数ID，无法区分用户、群组和频道，因此三种都包含在内
+    """
+    try:
+        chat_id = int(telegram_chat_id)
+    except (TypeError, ValueError):
+        return set()
+    if chat_id < 0:
+        return {chat_id}
+    return {get_peer_id(PeerUser(chat_id)), get_peer_id(PeerChat(chat_id)), get_peer_id(PeerChannel(chat_id))}
+
+
+class RuleIndex:
+    """
+    转发规则路由索引，以源聊天的 telegram_chat_id 为键保存规则快照
+
+    规则相关的数据在任意会话中提交后，索引会自动失效并重新加载
+    """
+
+    def __init__(self):
+        self._rules: Dict[str, Tuple[RuleSnapshot, ...]] = {}
+        self._rules_by_id: Dict[int, RuleSnapshot] = {}
+        self._source_peer_ids: FrozenSet[int] = frozenset()
+        self._delay_source_peer_ids: FrozenSet[int] = frozenset()
+        self._loaded = False
+        self._reload_scheduled = False
+
+    def reload(self):
+        """通过一次批量查询重建索引"""
+        session = get_session()
+        try:
+            rules = session.query(ForwardRule).options(
+                joinedload(ForwardRule.source_chat),
+                joinedload(ForwardRule.target_chat),
+                selectinload(ForwardRule.keywords),
+                selectinload(ForwardRule.replace_rules)
+            ).order_by(ForwardRule.id).all()
+
+            index = {}
+            for rule in rules:
+                snapshot = RuleSnapshot.from_model(rule)
+                index.setdefault(snapshot.source_chat.telegram_chat_id, []).append(snapshot)
+        finally:
+            session.close()
+
+        self._rules = {chat_id: tuple(snapshots) for chat_id, snapshots in index.items()}
+        self._rules_by_id = {rule.id: rule for snapshots in self._rules.values() for rule in snapshots}
+        # 至少有一条启用的规则的源聊天
+        self._source_peer_ids = frozenset(
+            peer_id
+            for chat_id, snapshots in self._rules.items() if any(rule.enable_rule for rule in snapshots)
+            for peer_id in get_marked_peer_ids(chat_id)
+        )
+        # 有启用了延迟处理的规则的源聊天
+        self._delay_source_peer_ids = frozenset(
+            peer_id
+            for chat_id, snapshots in self._rules.items()
+            if any(rule.enable_rule and rule.enable_delay and rule.delay_seconds > 0 for rule in snapshots)
+            for peer_id in get_marked_peer_ids(chat_id)
+        )
+        self._loaded = True
+
+        # 同一源聊天的多条规则共用一个合并的关键字匹配器
+        update_source_matchers(self._rules)
+        logger.info(f'规则索引已加载: {len(rules)} 条规则, {len(self._rules)} 个源聊天')
+
+    def get_rules(self, telegram_chat_id) -> Tuple[RuleSnapshot, ...]:
+        """获取以指定聊天为源的所有规则快照，未知聊天返回空元组"""
+        if not self._loaded:
+            self.reload()
+        return self._rules.get(str(telegram_chat_id), ())
+
+    def get_rule(self, rule_id) -> Optional[RuleSnapshot]:
+        """按ID获取规则快照，不存在时返回 None"""
+        if not self._loaded:
+            self.reload()
+        return self._rules_by_id.get(rule_id)
+
+    def get_source_peer_ids(self) -> FrozenSet[int]:
+        """获取所有启用的规则的源聊天（带标记的 peer ID），用于在事件分发时过滤消息"""
+        if not self._loaded:
+            self.reload()
+        return self._source_peer_ids
+
+    def get_delay_source_peer_ids(self) -> FrozenSet[int]:
+        """获取有启用了延迟处理的规则的源聊天（带标记的 peer ID）"""
+        if not self._loaded:
+            self.reload()
+        return self._delay_source_peer_ids
+
+    def invalidate(self):
+        """标记索引失效，并在事件循环中尽快重新加载"""
+        self._loaded = False
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if not self._reload_scheduled:
+            self._reload_scheduled = True
+            loop.call_soon(self._scheduled_reload)
+
+    def _scheduled_reload(self):
+        self._reload_scheduled = False
+        if self._loaded:
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            logger.error(f'重新加载规则索引时出错: {str(e)}')
+
+
+# 创建全局实例
+rule_index = RuleIndex()
+
+# 影响规则快照内容的模型
+_INDEXED_MODELS = (Chat, ForwardRule, Keyword, ReplaceRule)
+_DIRTY_KEY = 'rule_index_dirty'
+
+
+@event.listens_for(Session, 'after_flush')
+def _mark_dirty_after_flush(session, flush_context):
+    """记录本次事务是否修改了规则相关的数据"""
+    if any(isinstance(obj, _INDEXED_MODELS) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _mark_dirty_on_bulk_execute(orm_execute_state):
+    """query(...).delete() / update() 等批量操作不会经过 flush，需要单独记录"""
+    if orm_execute_state.is_update or orm_execute_state.is_delete:
+        if any(mapper.class_ in _INDEXED_MODELS for mapper in orm_execute_state.all_mappers):
+            orm_execute_state.session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_after_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        rule_index.invalidate()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _reset_after_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
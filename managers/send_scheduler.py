@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+
+from telethon import errors
+
+from utils.coalescing_client import override_flood_sleep_threshold
+from utils.token_bucket import TokenBucket
+from utils.constants import (
+    SEND_CHAT_RATE, SEND_CHAT_BURST, SEND_CLIENT_RATE, SEND_CLIENT_BURST, SEND_FLOOD_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Lane:
+    """一个客户端发往一个目标聊天的发送通道"""
+
+    __slots__ = ('chat_id', 'lock', 'bucket', 'paused_until', 'queued')
+
+    def __init__(self, chat_id, bucket):
+        self.chat_id = chat_id
+        self.lock = asyncio.Lock()
+        self.bucket = bucket
+        self.paused_until = 0
+        self.queued = 0
+
+
+class SendScheduler:
+    """
+    出站消息调度器
+
+    每个客户端发往每个目标聊天的消息经过一个发送通道，通道内按顺序发送，
+    并受目标聊天和客户端两级令牌桶限速。遇到 FloodWait 时只暂停对应的通道，
+    等待结束后重新发送，其他目标聊天不受影响
+    """
+
+    def __init__(self, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 client_rate=SEND_CLIENT_RATE, client_burst=SEND_CLIENT_BURST, flood_retries=SEND_FLOOD_RETRIES):
+        self._chat_rate = chat_rate
+        self._chat_burst = chat_burst
+        self._client_rate = client_rate
+        self._client_burst = client_burst
+        self._flood_retries = flood_retries
+        # (客户端, 目标聊天) -> 发送通道
+        self._lanes = {}
+        # 客户端 -> 令牌桶
+        self._client_buckets = {}
+
+    def _get_lane(self, client, chat_id):
+        key = (id(client), int(chat_id))
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _Lane(int(chat_id), TokenBucket(self._chat_rate, self._chat_burst))
+        return lane
+
+    def _get_client_bucket(self, client):
+        bucket = self._client_buckets.get(id(client))
+        if bucket is None:
+            bucket = self._client_buckets[id(client)] = TokenBucket(self._client_rate, self._client_burst)
+        return bucket
+
+    async def send(self, client, chat_id, method, *args, cost=1, **kwargs):
+        """
+        通过发送通道调用发送方法
+
+        Args:
+            client: 发送消息的客户端
+            chat_id: 目标聊天ID
+            method: 发送方法，例如 client.send_message
+            *args: 传给发送方法的参数
+            cost: 消耗的令牌数（媒体组为消息条数）
+            **kwargs: 传给发送方法的参数
+
+        Returns:
+            发送方法的返回值
+        """
+        lane = self._get_lane(client, chat_id)
+        lane.queued += 1
+        try:
+            async with lane.lock:
+                attempt = 0
+                while True:
+                    delay = lane.paused_until - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await lane.bucket.acquire(cost)
+                    await self._get_client_bucket(client).acquire(cost)
+                    try:
+                        # FloodWait 由调度器处理，不让 Telethon 在请求内部等待
+                        with override_flood_sleep_threshold(0):
+                            return await method(*args, **kwargs)
+                    except (errors.FloodWaitError, errors.SlowModeWaitError) as e:
+                        attempt += 1
+                        if attempt > self._flood_retries:
+                            raise
+                        lane.paused_until = time.monotonic() + e.seconds
+                        logger.warning(
+                            f'发往 {lane.chat_id} 的消息触发限流，该通道暂停 {e.seconds} 秒后重试'
+                            f'（第 {attempt} 次，通道中等待 {lane.queued - 1} 条）'
+                        )
+        finally:
+            lane.queued -= 1
+
+    def get_queue_depth(self, client, chat_id):
+        """获取发送通道中正在等待或发送的消息数"""
+        lane = self._lanes.get((id(client), int(chat_id)))
+        return lane.queued if lane else 0
+
+    def metrics(self):
+        """获取所有有消息等待或处于暂停中的发送通道"""
+        now = time.monotonic()
+        return [
+            {
+                'chat_id': lane.chat_id,
+                'queued': lane.queued,
+                'paused': max(0.0, lane.paused_until - now),
+            }
+            for lane in self._lanes.values()
+            if lane.queued or lane.paused_until > now
+        ]
+
+
+# 创建全局实例
+send_scheduler = SendScheduler()
@@ -197,6 +197,16 @@ AI_SETTINGS = {
         'toggle_action': 'change_model',
         'toggle_func': None
     },
+    'ai_fallback_model': {
+        'display_name': '备用AI模型',
+        'values': {
+            None: '不使用',
+            '': '不使用',
+            **{model: model for model in AI_MODELS}
+        },
+        'toggle_action': 'change_fallback_model',
+        'toggle_func': None
+    },
     'ai_prompt': {
         'display_name': '设置AI处理提示词',
         'toggle_action': 'set_ai_prompt',
@@ -211,6 +221,15 @@ AI_SETTINGS = {
         'toggle_action': 'toggle_keyword_after_ai',
         'toggle_func': lambda current: not current
     },
+    'enable_ai_cache': {
+        'display_name': '复用相同内容的AI处理结果',
+        'values': {
+            True: '开启',
+            False: '关闭'
+        },
+        'toggle_action': 'toggle_ai_cache',
+        'toggle_func': lambda current: not current
+    },
     'is_summary': {
         'display_name': 'AI总结',
         'values': {
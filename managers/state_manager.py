@@ -1,19 +1,24 @@
 import logging
-from typing import Dict, Tuple, Optional
+from typing import Tuple, Optional
+from utils.ttl_cache import TTLCache
 
 logger = logging.getLogger(__name__)
 
 class StateManager:
     def __init__(self):
-        self._states: Dict[Tuple[int, int], str] = {}
+        self._states = TTLCache(on_expire=self._on_expire, name='用户状态')
         logger.info("StateManager 初始化")
     
-    def set_state(self, user_id: int, chat_id: int, state: str) -> None:
-        """设置用户状态"""
+    @staticmethod
+    def _on_expire(key: Tuple[int, int], state: str) -> None:
+        logger.info(f"状态超时自动取消 - key: {key}, state: {state}")
+    
+    def set_state(self, user_id: int, chat_id: int, state: str, timeout: Optional[float] = None) -> None:
+        """设置用户状态，timeout 秒后自动取消（None 表示不自动取消）"""
         key = (user_id, chat_id)
-        self._states[key] = state
+        self._states.set(key, state, ttl=timeout)
         logger.info(f"设置状态 - key: {key}, state: {state}")
-        logger.debug(f"当前所有状态: {self._states}")  # 改为 debug 级别
+        logger.debug(f"当前所有状态: {self._states.items()}")  # 改为 debug 级别
     
     def get_state(self, user_id: int, chat_id: int) -> Optional[str]:
         """获取用户状态"""
@@ -26,10 +31,9 @@ class StateManager:
     def clear_state(self, user_id: int, chat_id: int) -> None:
         """清除用户状态"""
         key = (user_id, chat_id)
-        if key in self._states:
-            del self._states[key]
+        if self._states.pop(key) is not None:
             logger.info(f"清除状态 - key: {key}")
-        logger.debug(f"当前所有状态: {self._states}")  # 改为 debug 级别
+        logger.debug(f"当前所有状态: {self._states.items()}")  # 改为 debug 级别
     
     def check_state(self) -> bool:
         """检查是否存在状态"""
@@ -1,7 +1,6 @@
 from telethon import events
-from models.models import get_session, Chat, ForwardRule
 import logging
-from handlers import user_handler, bot_handler
+from handlers import bot_handler
 from handlers.prompt_handlers import handle_prompt_setting
 import asyncio
 import os
@@ -10,9 +9,17 @@ import re
 from telethon.tl.types import ChannelParticipantsAdmins
 from managers.settings_manager import create_buttons
 from managers.state_manager import state_manager
-from telethon.tl import types
+from managers.rule_index import rule_index
+from managers.dispatch_manager import forward_dispatcher
+from managers.ingress_manager import ingress_queue
+from managers.album_manager import album_aggregator
+from managers.peer_cache import peer_cache, resolve_peer
+from managers.outbox_manager import outbox
+from managers.edit_tracker import edit_tracker
+from utils.constants import DELAY_EDIT_TRACKING
+from handlers.outbox_handler import build_rule_job
+from telethon.utils import get_peer_id
 from utils.common import get_ai_settings_text
-from filters.process import process_forward_rule
 # 加载环境变量
 load_dotenv()
 
@@ -38,10 +45,30 @@ else:
     logging.getLogger('handlers.user_handler').setLevel(logging.CRITICAL)
 logger = logging.getLogger(__name__)
 
-# 添加一个缓存来存储已处理的媒体组
-PROCESSED_GROUPS = set()
 
 
+class SourceChatMessage(events.NewMessage):
+    """
+    只接收转发规则源聊天消息的 NewMessage 事件
+
+    源聊天集合取自规则索引，绑定或删除规则后自动更新；在 Telethon 分发事件时
+    直接丢弃无关聊天的消息。存在用户状态（例如正在设置提示词）时放行所有消息
+    """
+
+    def filter(self, event):
+        if event.chat_id not in rule_index.get_source_peer_ids() and not state_manager.check_state():
+            return None
+        return super().filter(event)
+
+
+class DelaySourceMessageEdited(events.MessageEdited):
+    """只接收启用了延迟处理的源聊天的消息编辑事件"""
+
+    def filter(self, event):
+        if event.chat_id not in rule_index.get_delay_source_peer_ids():
+            return None
+        return super().filter(event)
+
 
 def setup_listeners(user_client, bot_client):
     """
@@ -51,10 +78,40 @@ def setup_listeners(user_client, bot_client):
         user_client: 用户客户端（用于监听消息和转发）
         bot_client: 机器人客户端（用于处理命令和转发）
     """
+    async def handle_queued_message(event):
+        await handle_user_message(event, user_client, bot_client)
+
+    async def load_queued_message(record):
+        # 重新获取溢出到磁盘的消息
+        message = await user_client.get_messages(record['chat_id'], ids=record['message_id'])
+        if not message:
+            logger.warning(f"溢出的消息已不存在: {record['chat_id']}/{record['message_id']}")
+            return None
+        event = events.NewMessage.Event(message)
+        event._set_client(user_client)
+        return event
+
+    # 用户消息先进入按源聊天划分的有界队列，由固定数量的工作协程处理
+    ingress_queue.start(handle_queued_message, dump_queued_message, load_queued_message, drop_queued_message)
+
     # 用户客户端监听器
-    @user_client.on(events.NewMessage)
+    @user_client.on(SourceChatMessage())
     async def user_message_handler(event):
-        await handle_user_message(event, user_client, bot_client)
+        # 媒体组只有第一条消息进入队列，其余消息由聚合器收集到同一个媒体组中
+        if event.message.grouped_id and not album_aggregator.add(event.message):
+            return
+        # 在发件箱中记录待处理的转发，进程在处理完成前重启时可以恢复
+        chat_id, _ = resolve_peer(event.message.peer_id)
+        for rule in rule_index.get_rules(chat_id):
+            if rule.enable_rule:
+                outbox.add(rule.id, event.chat_id, event.message.id)
+        await ingress_queue.put(event.chat_id, event)
+    
+    if DELAY_EDIT_TRACKING:
+        # 延迟处理的消息被编辑后立即结束等待
+        @user_client.on(DelaySourceMessageEdited())
+        async def user_edit_handler(event):
+            edit_tracker.on_edit(event.message)
     
     # 机器人客户端监听器
     @bot_client.on(events.NewMessage)
@@ -64,16 +121,28 @@ def setup_listeners(user_client, bot_client):
     # 注册机器人回调处理器
     bot_client.add_event_handler(bot_handler.callback_handler)
 
+def dump_queued_message(event):
+    """将消息事件转换为溢出记录"""
+    return {'chat_id': event.chat_id, 'message_id': event.message.id}
+
+def drop_queued_message(event):
+    """队列丢弃的消息不再处理，结束其在发件箱中的条目，重启后不会恢复"""
+    outbox.finish_message(event.chat_id, event.message.id)
+
 async def handle_user_message(event, user_client, bot_client):
     """处理用户客户端收到的消息"""
-    chat = await event.get_chat()
-    chat_id = abs(chat.id)
+    # 聊天ID和频道标记直接从消息的 peer 解析，不需要网络请求
+    peer = event.message.peer_id
+    chat_id, is_channel = resolve_peer(peer)
+    # 更新中附带的聊天实体顺便写入缓存，供后续过滤器使用
+    if event.chat:
+        peer_cache.remember(event.chat)
 
     # 检查是否频道消息
-    if isinstance(event.chat, types.Channel) and state_manager.check_state():
+    if is_channel and state_manager.check_state():
         sender_id = os.getenv('USER_ID')
-        # 频道ID需要加上100前缀
-        chat_id = int(f"100{chat_id}")
+        # 频道ID使用带100前缀的ID
+        chat_id = abs(get_peer_id(peer))
     else:
         sender_id = event.sender_id
 
@@ -83,80 +152,48 @@ async def handle_user_message(event, user_client, bot_client):
         logger.info(f"当前用户状态: {current_state}")
         # 处理提示词设置
         if await handle_prompt_setting(event, bot_client, sender_id, chat_id, current_state):
+            outbox.finish_message(event.chat_id, event.message.id)
             return
 
-    # 检查是否是媒体组消息
-    if event.message.grouped_id:
-        # 如果这个媒体组已经处理过，就跳过
-        group_key = f"{chat_id}:{event.message.grouped_id}"
-        if group_key in PROCESSED_GROUPS:
-            return
-        # 标记这个媒体组为已处理
-        PROCESSED_GROUPS.add(group_key)
-        # 设置一个合理的过期时间（比如5分钟后）
-        asyncio.create_task(clear_group_cache(group_key))
-    
+    # 从规则索引中查找以当前聊天为源的规则
+    rules = rule_index.get_rules(chat_id)
+    if not rules:
+        outbox.finish_message(event.chat_id, event.message.id)
+        return
+
+    source_chat = rules[0].source_chat
+
     # 记录消息信息
-    session = get_session()
-    try:
-        chat_exists = session.query(Chat).filter(
-            Chat.telegram_chat_id == str(chat_id)  # 这里转换为字符串
-        ).first()
-        
-        if chat_exists:
-            if event.message.grouped_id:
-                logger.info(f'[用户] 收到媒体组消息 来自聊天: {chat_exists.name} ({chat_id}) 组ID: {event.message.grouped_id}')
-            else:
-                logger.info(f'[用户] 收到新消息 来自聊天: {chat_exists.name} ({chat_id}) 内容: {event.message.text}')
-    finally:
-        session.close()
-    
-    # 检查数据库中是否有该聊天的转发规则
-    session = get_session()
-    try:
-        # 查询源聊天
-        source_chat = session.query(Chat).filter(
-            Chat.telegram_chat_id == str(chat_id)
-        ).first()
-        
-        if not source_chat:
-            return
-            
-        # 添加日志：查询转发规则
-        logger.info(f'找到源聊天: {source_chat.name} (ID: {source_chat.id})')
-        
-        # 查找以当前聊天为源的规则
-        rules = session.query(ForwardRule).filter(
-            ForwardRule.source_chat_id == source_chat.id
-        ).all()
-        
-        if not rules:
-            logger.info(f'聊天 {source_chat.name} 没有转发规则')
-            return
-            
-        # 添加日志：处理规则
-        logger.info(f'找到 {len(rules)} 条转发规则')
+    if event.message.grouped_id:
+        # 等待媒体组收集完成，所有规则共用同一个媒体组
+        album = await album_aggregator.wait(user_client, event.message)
+        logger.info(f'[用户] 收到媒体组消息 来自聊天: {source_chat.name} ({chat_id}) 组ID: {event.message.grouped_id} 共 {len(album.message_ids)} 条')
+    else:
+        logger.info(f'[用户] 收到新消息 来自聊天: {source_chat.name} ({chat_id}) 内容: {event.message.text}')
 
+    # 添加日志：处理规则
+    logger.info(f'找到 {len(rules)} 条转发规则')
 
-        
-        # 处理每条转发规则
+    try:
+        # 收集需要执行的转发规则
+        jobs = []
         for rule in rules:
             target_chat = rule.target_chat
             if not rule.enable_rule:
                 logger.info(f'规则 {rule.id} 未启用')
                 continue
             logger.info(f'处理转发规则 ID: {rule.id} (从 {source_chat.name} 转发到: {target_chat.name})')
-            if rule.use_bot:
-                # 直接使用过滤器模块中的process_forward_rule函数
-                await process_forward_rule(bot_client, event, str(chat_id), rule)
-            else:
-                await user_handler.process_forward_rule(user_client, event, str(chat_id), rule)
+            jobs.append(build_rule_job(rule, event, chat_id, user_client, bot_client))
+
+        # 入队后被停用的规则不再执行
+        outbox.finish_message(event.chat_id, event.message.id, exclude={rule.id for rule, _, _ in jobs})
+
+        # 各规则并发执行，发往同一目标聊天的消息保持源消息顺序
+        await forward_dispatcher.dispatch(jobs)
         
     except Exception as e:
         logger.error(f'处理用户消息时发生错误: {str(e)}')
         logger.exception(e)  # 添加详细的错误堆栈
-    finally:
-        session.close()
 
 async def handle_bot_message(event, bot_client):
     """处理机器人客户端收到的消息（命令）"""
@@ -178,11 +215,6 @@ async def handle_bot_message(event, bot_client):
         logger.error(f'处理机器人命令时发生错误: {str(e)}')
         logger.exception(e)
 
-async def clear_group_cache(group_key, delay=300):  # 5分钟后清除缓存
-    """清除已处理的媒体组记录"""
-    await asyncio.sleep(delay)
-    PROCESSED_GROUPS.discard(group_key) 
-
 async def is_admin(channel_id, user_id, client):
     """检查用户是否为频道管理员"""
     try:
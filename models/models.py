@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, ForeignKey, Enum, UniqueConstraint, inspect, text
+from sqlalchemy import create_engine, event, Column, Integer, String, Boolean, Float, ForeignKey, Enum, UniqueConstraint, Index, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
 from enums.enums import ForwardMode, PreviewMode, MessageMode, AddMode, HandleMode
@@ -8,6 +8,16 @@ import os
 
 Base = declarative_base()
 
+DATABASE_URL = 'sqlite:///./db/forward.db'
+
+# SQLite 连接参数，通过连接时的 PRAGMA 设置
+SQLITE_CACHE_SIZE_MB = int(os.getenv('SQLITE_CACHE_SIZE_MB', 64))
+SQLITE_MMAP_SIZE_MB = int(os.getenv('SQLITE_MMAP_SIZE_MB', 256))
+
+# 进程内共享的数据库引擎和会话工厂，由 get_engine() 首次调用时创建
+engine = None
+Session = sessionmaker()
+
 class Chat(Base):
     __tablename__ = 'chats'
 
@@ -46,11 +56,13 @@ class ForwardRule(Base):
     # AI相关字段
     is_ai = Column(Boolean, default=False)  # 是否启用AI处理
     ai_model = Column(String, nullable=True)  # 使用的AI模型
+    ai_fallback_model = Column(String, nullable=True)  # AI模型失败或熔断时使用的备用模型
     ai_prompt = Column(String, nullable=True)  # AI处理的prompt
     is_summary = Column(Boolean, default=False)  # 是否启用AI总结
     summary_time = Column(String(5), default=os.getenv('DEFAULT_SUMMARY_TIME', '07:00'))
     summary_prompt = Column(String, nullable=True)  # AI总结的prompt
     is_keyword_after_ai = Column(Boolean, default=False) # AI处理后是否再次执行关键字过滤
+    enable_ai_cache = Column(Boolean, default=True)  # 是否复用相同模型、提示词和内容的AI处理结果
     is_top_summary = Column(Boolean, default=True) # 是否顶置总结消息
     enable_delay = Column(Boolean, default=False)  # 是否启用延迟处理
     delay_seconds = Column(Integer, default=5)  # 延迟处理秒数
@@ -99,6 +111,41 @@ class ReplaceRule(Base):
         UniqueConstraint('rule_id', 'pattern', 'content', name='unique_rule_pattern_content'),
     )
 
+class OutboxEntry(Base):
+    """发件箱中待完成的转发，进程重启后继续处理"""
+    __tablename__ = 'outbox'
+
+    id = Column(Integer, primary_key=True)
+    rule_id = Column(Integer, nullable=False)
+    source_chat_id = Column(Integer, nullable=False)  # 带标记的源聊天ID
+    message_id = Column(Integer, nullable=False)  # 源消息ID，媒体组为第一条消息的ID
+    status = Column(String, nullable=False, default='pending')
+    text = Column(String, nullable=True)  # 渲染后的消息文本
+    media_ids = Column(String, nullable=True)  # 需要发送媒体的源消息ID列表（JSON）
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('rule_id', 'source_chat_id', 'message_id', name='unique_outbox_rule_message'),
+        Index('ix_outbox_status', 'status'),
+    )
+
+class AICacheEntry(Base):
+    """AI处理结果缓存"""
+    __tablename__ = 'ai_cache'
+
+    key = Column(String(64), primary_key=True)  # 模型、提示词和消息内容的 SHA-256
+    model = Column(String, nullable=False)
+    response = Column(String, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(Float, nullable=False)
+    accessed_at = Column(Float, nullable=False)
+
+    __table_args__ = (
+        Index('ix_ai_cache_accessed_at', 'accessed_at'),
+    )
+
 def migrate_db(engine):
     """数据库迁移函数，确保新字段的添加"""
     inspector = inspect(engine)
@@ -129,6 +176,8 @@ def migrate_db(engine):
         'delay_seconds': 'ALTER TABLE forward_rules ADD COLUMN delay_seconds INTEGER DEFAULT 5',
         'handle_mode': 'ALTER TABLE forward_rules ADD COLUMN handle_mode VARCHAR DEFAULT "FORWARD"',
         'enable_comment_button': 'ALTER TABLE forward_rules ADD COLUMN enable_comment_button BOOLEAN DEFAULT FALSE',
+        'enable_ai_cache': 'ALTER TABLE forward_rules ADD COLUMN enable_ai_cache BOOLEAN DEFAULT TRUE',
+        'ai_fallback_model': 'ALTER TABLE forward_rules ADD COLUMN ai_fallback_model VARCHAR DEFAULT NULL',
     }
 
     keywords_new_columns = {
@@ -220,9 +269,40 @@ def migrate_db(engine):
         except Exception as e:
             logging.error(f'更新唯一约束时出错: {str(e)}')
 
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """为每个新建的 SQLite 连接设置 PRAGMA"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL 模式下读写互不阻塞，NORMAL 同步级别在 WAL 下仍能保证数据库一致性
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        # 负值表示以 KiB 为单位
+        cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_MB * 1024}')
+        cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}')
+        cursor.execute('PRAGMA temp_store=MEMORY')
+    finally:
+        cursor.close()
+
+def get_engine():
+    """获取进程内共享的数据库引擎，首次调用时创建并绑定会话工厂"""
+    global engine
+    if engine is None:
+        engine = create_engine(
+            DATABASE_URL,
+            pool_size=5,
+            # 所有数据库操作都在事件循环线程中同步执行，连接池耗尽时不能阻塞等待，
+            # 因此不限制溢出连接数
+            max_overflow=-1,
+            pool_pre_ping=True
+        )
+        event.listen(engine, 'connect', _set_sqlite_pragma)
+        Session.configure(bind=engine)
+        logging.info(f'数据库引擎已创建: {DATABASE_URL}')
+    return engine
+
 def init_db():
     """初始化数据库"""
-    engine = create_engine('sqlite:///./db/forward.db')
+    engine = get_engine()
 
     # 首先创建所有表
     Base.metadata.create_all(engine)
@@ -233,9 +313,8 @@ def init_db():
     return engine
 
 def get_session():
-    """创建会话工厂"""
-    engine = create_engine('sqlite:///./db/forward.db')
-    Session = sessionmaker(bind=engine)
+    """从共享的会话工厂获取会话"""
+    get_engine()
     return Session()
 
 if __name__ == '__main__':
@@ -6,7 +6,7 @@ import logging
 import os
 from dotenv import load_dotenv
 from telethon import TelegramClient
-from ai import get_ai_provider
+from ai import ai_executor
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -177,13 +177,12 @@ class SummaryScheduler:
                     
                 all_messages = '\n'.join(messages)
                 
-                # 获取AI提供者并处理总结
-                provider = await get_ai_provider(rule.ai_model)
-                await provider.initialize()
-                summary = await provider.process_message(
+                # 通过AI执行层处理总结
+                summary = await ai_executor.process_message(
+                    rule.ai_model or os.getenv('DEFAULT_AI_MODEL', 'gemini-2.0-flash'),
                     all_messages,
                     prompt=rule.summary_prompt or os.getenv('DEFAULT_SUMMARY_PROMPT'),
-                    model=rule.ai_model
+                    fallback_model=rule.ai_fallback_model
                 )
                 
                 
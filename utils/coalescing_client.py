@@ -0,0 +1,133 @@
+import asyncio
+import contextvars
+import logging
+from contextlib import contextmanager
+from functools import partial
+
+from telethon import TelegramClient
+from telethon.tl.functions.channels import GetFullChannelRequest, GetMessagesRequest as GetChannelMessagesRequest
+from telethon.tl.functions.messages import GetFullChatRequest, GetMessagesRequest
+from telethon.tl.functions.users import GetFullUserRequest
+
+from utils.constants import READ_CACHE_TTL
+from utils.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# 当前上下文中请求的 FloodWait 自动等待阈值，None 表示使用客户端的设置
+_flood_sleep_threshold = contextvars.ContextVar('flood_sleep_threshold', default=None)
+
+
+@contextmanager
+def override_flood_sleep_threshold(seconds):
+    """
+    在当前上下文中覆盖 FloodWait 自动等待阈值
+
+    设置为 0 时，上下文中发出的请求遇到 FloodWait 直接抛出 FloodWaitError，
+    由调用者自行决定如何等待
+    """
+    token = _flood_sleep_threshold.set(seconds)
+    try:
+        yield
+    finally:
+        _flood_sleep_threshold.reset(token)
+
+
+def _freeze(value):
+    """将列表转换为元组，使参数可以作为字典键"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def make_request_key(name, args, kwargs):
+    """
+    根据方法名和参数生成请求键
+
+    Returns:
+        tuple: 请求键，参数无法作为字典键时返回 None
+    """
+    key = (name, _freeze(args), _freeze(kwargs))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class CoalescingTelegramClient(TelegramClient):
+    """
+    合并并发读请求的 TelegramClient
+
+    同一消息分发给多条规则时，各规则会同时发出相同的读请求（例如按ID重新获取消息、
+    获取频道完整信息）。方法和参数相同的并发请求共用一个正在进行的请求；
+    设置了 READ_CACHE_TTL 时，请求结果在该时间内直接复用。
+    返回的对象由所有调用者共享，不能原地修改
+    """
+
+    # 会被合并的只读 API 请求
+    COALESCED_REQUESTS = (
+        GetFullChannelRequest,
+        GetFullChatRequest,
+        GetFullUserRequest,
+        GetMessagesRequest,
+        GetChannelMessagesRequest,
+    )
+
+    def __init__(self, *args, read_cache_ttl=READ_CACHE_TTL, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 请求键 -> 正在进行的请求任务
+        self._inflight = {}
+        self._read_cache = TTLCache(ttl=read_cache_ttl, maxsize=1000, name='读请求缓存') if read_cache_ttl > 0 else None
+        self.coalesced_requests = 0
+
+    async def get_messages(self, *args, **kwargs):
+        return await self._coalesce('get_messages', super().get_messages, args, kwargs)
+
+    async def get_entity(self, entity):
+        return await self._coalesce('get_entity', super().get_entity, (entity,), {})
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        if flood_sleep_threshold is None:
+            flood_sleep_threshold = _flood_sleep_threshold.get()
+        call = super().__call__
+        if ordered or not isinstance(request, self.COALESCED_REQUESTS):
+            return await call(request, ordered, flood_sleep_threshold)
+        # 请求对象本身不能作为字典键，使用其文本表示
+        return await self._coalesce(
+            type(request).__name__, call, (request,), {'flood_sleep_threshold': flood_sleep_threshold}, str(request)
+        )
+
+    async def _coalesce(self, name, method, args, kwargs, key_args=None):
+        key = make_request_key(name, args if key_args is None else key_args, kwargs)
+        if key is None:
+            return await method(*args, **kwargs)
+
+        if self._read_cache is not None:
+            result = self._read_cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(method(*args, **kwargs))
+            task.add_done_callback(partial(self._request_done, key))
+        else:
+            self.coalesced_requests += 1
+            logger.debug(f'合并相同的读请求: {name}')
+
+        # 请求由所有调用者共享，单个调用者被取消不影响其他调用者
+        return await asyncio.shield(task)
+
+    def _request_done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        # 取出异常，所有调用者都已取消时不会产生未处理异常的警告
+        if task.exception() is None and self._read_cache is not None:
+            self._read_cache.set(key, task.result())
@@ -10,6 +10,7 @@ import re
 import telethon
 
 from utils.constants import AI_SETTINGS_TEXT
+from utils.keyword_matcher import get_keyword_matcher, WHITELIST_HIT, BLACKLIST_HIT
 
 logger = logging.getLogger(__name__)
 
@@ -139,144 +140,31 @@ async def check_keywords(rule, message_text):
     Returns:
         bool: 是否应该转发消息
     """
-
-
     logger.info("开始检查关键字规则")
     logger.info(f"当前转发模式: {rule.forward_mode}")
     should_forward = None
     forward_mode = rule.forward_mode
+    matcher = get_keyword_matcher(rule)
 
     # 处理仅白名单或仅黑名单模式
-    if forward_mode in [ForwardMode.WHITELIST, ForwardMode.BLACKLIST]:
-        logger.info("进入仅白名单/仅黑名单模式")
-        is_whitelist = (forward_mode == ForwardMode.WHITELIST)
-        keywords = [k for k in rule.keywords if k.is_blacklist != is_whitelist]
-        logger.info(f"待检查关键词: {[k.keyword for k in keywords]}")
-        # 白名单模式默认不转发，黑名单模式默认转发
-        should_forward = not is_whitelist  
-        logger.info(f"初始 should_forward 设置为: {should_forward}")
-
-        for keyword in keywords:
-            logger.info(f"检查{'白名单' if is_whitelist else '黑名单'}关键字: {keyword.keyword} (正则: {keyword.is_regex})")
-            matched = False
-            if keyword.is_regex:
-                try:
-                    if re.search(keyword.keyword, message_text):
-                        matched = True
-                        logger.info(f"正则匹配成功: {keyword.keyword}")
-                except re.error:
-                    logger.error(f"正则表达式错误: {keyword.keyword}")
-            else:
-                if keyword.keyword.lower() in message_text.lower():
-                    matched = True
-                    logger.info(f"关键字匹配成功: {keyword.keyword}")
-            if matched:
-                should_forward = is_whitelist
-                logger.info(f"匹配到关键词 '{keyword.keyword}'，设置 should_forward 为: {should_forward}")
-                break
-        logger.info("结束仅白名单/仅黑名单模式检查")
-
-    # 处理 先白后黑 模式
-    elif forward_mode == ForwardMode.WHITELIST_THEN_BLACKLIST:
-        logger.info("进入 先白后黑 模式")
-        # 先检查白名单：必须匹配至少一个白名单关键词
-        whitelist_keywords = [k for k in rule.keywords if not k.is_blacklist]
-        logger.info(f"白名单关键词: {[k.keyword for k in whitelist_keywords]}")
-        should_forward = False
-        for keyword in whitelist_keywords:
-            logger.info(f"检查白名单关键字: {keyword.keyword} (正则: {keyword.is_regex})")
-            matched = False
-            if keyword.is_regex:
-                try:
-                    if re.search(keyword.keyword, message_text):
-                        matched = True
-                        logger.info(f"白名单正则匹配成功: {keyword.keyword}")
-                except re.error:
-                    logger.error(f"正则表达式错误: {keyword.keyword}")
-            else:
-                if keyword.keyword.lower() in message_text.lower():
-                    matched = True
-                    logger.info(f"白名单关键字匹配成功: {keyword.keyword}")
-            if matched:
-                should_forward = True
-                logger.info(f"匹配到白名单关键词 '{keyword.keyword}'，设置 should_forward 为: True")
-                break
-
-        # 如果白名单匹配成功，再检查黑名单
-        if should_forward:
-            logger.info("白名单匹配成功，开始检查黑名单关键词")
-            blacklist_keywords = [k for k in rule.keywords if k.is_blacklist]
-            logger.info(f"黑名单关键词: {[k.keyword for k in blacklist_keywords]}")
-            for keyword in blacklist_keywords:
-                logger.info(f"检查黑名单关键字: {keyword.keyword} (正则: {keyword.is_regex})")
-                matched = False
-                if keyword.is_regex:
-                    try:
-                        if re.search(keyword.keyword, message_text):
-                            matched = True
-                            logger.info(f"黑名单正则匹配成功: {keyword.keyword}")
-                    except re.error:
-                        logger.error(f"正则表达式错误: {keyword.keyword}")
-                else:
-                    if keyword.keyword.lower() in message_text.lower():
-                        matched = True
-                        logger.info(f"黑名单关键字匹配成功: {keyword.keyword}")
-                if matched:
-                    should_forward = False
-                    logger.info(f"匹配到黑名单关键词 '{keyword.keyword}'，设置 should_forward 为: False")
-                    break
-        else:
-            logger.info("未匹配到任何白名单关键词，直接不转发")
-        logger.info("结束 先白后黑 模式检查")
-
-    # 处理 先黑后白 模式
-    elif forward_mode == ForwardMode.BLACKLIST_THEN_WHITELIST:
-        logger.info("进入 先黑后白 模式")
-        # 先检查黑名单：如果匹配任一黑名单关键词，直接拒绝转发
-        blacklist_keywords = [k for k in rule.keywords if k.is_blacklist]
-        logger.info(f"黑名单关键词: {[k.keyword for k in blacklist_keywords]}")
-        for keyword in blacklist_keywords:
-            logger.info(f"检查黑名单关键字: {keyword.keyword} (正则: {keyword.is_regex})")
-            matched = False
-            if keyword.is_regex:
-                try:
-                    if re.search(keyword.keyword, message_text):
-                        matched = True
-                        logger.info(f"黑名单正则匹配成功: {keyword.keyword}")
-                except re.error:
-                    logger.error(f"正则表达式错误: {keyword.keyword}")
-            else:
-                if keyword.keyword.lower() in message_text.lower():
-                    matched = True
-                    logger.info(f"黑名单关键字匹配成功: {keyword.keyword}")
-            if matched:
-                logger.info("匹配到黑名单关键词，拒绝转发消息")
-                return False
-
-        # 如果没有匹配到黑名单，再检查白名单：必须匹配至少一个白名单关键词
-        whitelist_keywords = [k for k in rule.keywords if not k.is_blacklist]
-        logger.info(f"白名单关键词: {[k.keyword for k in whitelist_keywords]}")
-        for keyword in whitelist_keywords:
-            logger.info(f"检查白名单关键字: {keyword.keyword} (正则: {keyword.is_regex})")
-            matched = False
-            if keyword.is_regex:
-                try:
-                    if re.search(keyword.keyword, message_text):
-                        matched = True
-                        logger.info(f"白名单正则匹配成功: {keyword.keyword}")
-                except re.error:
-                    logger.error(f"正则表达式错误: {keyword.keyword}")
-            else:
-                if keyword.keyword.lower() in message_text.lower():
-                    matched = True
-                    logger.info(f"白名单关键字匹配成功: {keyword.keyword}")
-            if matched:
-                logger.info("匹配到白名单关键词，转发消息")
-                return True
-
-        logger.info("未匹配到任何白名单关键词，拒绝转发")
-        should_forward = False
-        logger.info("结束 先黑后白 模式检查")
+    if forward_mode == ForwardMode.WHITELIST:
+        # 白名单模式默认不转发，匹配任一白名单关键词才转发
+        should_forward = bool(matcher.match(message_text, WHITELIST_HIT))
+        logger.info(f"仅白名单模式，{'匹配到' if should_forward else '未匹配到'}白名单关键词")
+
+    elif forward_mode == ForwardMode.BLACKLIST:
+        # 黑名单模式默认转发，匹配任一黑名单关键词则不转发
+        should_forward = not matcher.match(message_text, BLACKLIST_HIT)
+        logger.info(f"仅黑名单模式，{'未匹配到' if should_forward else '匹配到'}黑名单关键词")
+
+    # 处理 先白后黑 / 先黑后白 模式：必须匹配至少一个白名单关键词，且不能匹配任何黑名单关键词
+    elif forward_mode in (ForwardMode.WHITELIST_THEN_BLACKLIST, ForwardMode.BLACKLIST_THEN_WHITELIST):
+        hits = matcher.match(message_text)
+        should_forward = bool(hits & WHITELIST_HIT) and not hits & BLACKLIST_HIT
+        logger.info(
+            f"{'先白后黑' if forward_mode == ForwardMode.WHITELIST_THEN_BLACKLIST else '先黑后白'}模式，"
+            f"白名单{'匹配' if hits & WHITELIST_HIT else '未匹配'}，黑名单{'匹配' if hits & BLACKLIST_HIT else '未匹配'}"
+        )
 
     logger.info(f"关键字检查最终结果: {'转发' if should_forward else '不转发'}")
     return should_forward
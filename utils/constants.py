@@ -10,6 +10,82 @@ BASE_DIR = Path(__file__).parent.parent
 TEMP_DIR = os.path.join(BASE_DIR, 'temp')
 
 
+# 转发规则的最大并发处理数
+FORWARD_CONCURRENCY = int(os.getenv('FORWARD_CONCURRENCY', 10))
+
+# 消息入口队列配置
+INGRESS_QUEUE_SIZE = int(os.getenv('INGRESS_QUEUE_SIZE', 100))
+INGRESS_WORKERS = int(os.getenv('INGRESS_WORKERS', 4))
+INGRESS_OVERFLOW = os.getenv('INGRESS_OVERFLOW', 'block').lower()
+INGRESS_SPILL_DIR = os.path.join(BASE_DIR, 'db', 'ingress_spill')
+INGRESS_METRICS_INTERVAL = int(os.getenv('INGRESS_METRICS_INTERVAL', 60))
+
+# 媒体组最后一条消息到达后等待的时间（秒），超过后视为收集完成
+ALBUM_QUIET_PERIOD = float(os.getenv('ALBUM_QUIET_PERIOD', 1))
+# 已收集的媒体组保留时间（秒）
+ALBUM_TTL = 300
+
+# 闲置媒体缓存的磁盘上限（MB），0表示媒体发送完成后立即删除
+MEDIA_CACHE_SIZE_MB = float(os.getenv('MEDIA_CACHE_SIZE_MB', 0))
+
+# 已上传文件句柄的复用时间（秒）
+MEDIA_UPLOAD_TTL = int(os.getenv('MEDIA_UPLOAD_TTL', 600))
+
+# 聊天信息缓存文件，以及缓存的聊天信息（用户名、标题等）的刷新间隔（秒）
+PEER_CACHE_PATH = os.path.join(BASE_DIR, 'db', 'peer_cache.json')
+PEER_CACHE_TTL = int(os.getenv('PEER_CACHE_TTL', 86400))
+
+# 相同读请求（重新获取消息、频道完整信息等）的结果复用时间（秒），0表示只合并并发请求
+READ_CACHE_TTL = float(os.getenv('READ_CACHE_TTL', 0))
+
+# 出站消息限速：每个目标聊天和每个客户端每秒发送的消息数及允许的突发数量
+SEND_CHAT_RATE = float(os.getenv('SEND_CHAT_RATE', 1))
+SEND_CHAT_BURST = int(os.getenv('SEND_CHAT_BURST', 3))
+SEND_CLIENT_RATE = float(os.getenv('SEND_CLIENT_RATE', 25))
+SEND_CLIENT_BURST = int(os.getenv('SEND_CLIENT_BURST', 25))
+# 触发 FloodWait 后的最大重试次数
+SEND_FLOOD_RETRIES = int(os.getenv('SEND_FLOOD_RETRIES', 3))
+
+# 发件箱：状态变化批量提交的间隔（秒）和批量大小，重启后恢复未完成转发的最大次数
+OUTBOX_FLUSH_INTERVAL = float(os.getenv('OUTBOX_FLUSH_INTERVAL', 0.2))
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', 50))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 3))
+# 已结束的发件箱条目保留时间（秒）
+OUTBOX_RETENTION = 86400
+
+# 延迟处理的时间精度（秒），同一时间点到期的消息合并为一次获取
+DELAY_TICK = float(os.getenv('DELAY_TICK', 0.5))
+
+# 延迟处理时监听源聊天的消息编辑，消息被编辑后立即结束等待
+DELAY_EDIT_TRACKING = os.getenv('DELAY_EDIT_TRACKING', 'false').lower() == 'true'
+# 根据编辑延迟自动调整的等待时间下限（秒），以及开始自动调整前需要观察的消息数
+DELAY_EDIT_MIN_TIMEOUT = float(os.getenv('DELAY_EDIT_MIN_TIMEOUT', 1))
+DELAY_EDIT_MIN_SAMPLES = int(os.getenv('DELAY_EDIT_MIN_SAMPLES', 10))
+
+# AI 请求的超时时间（秒），超时后取消请求
+AI_TIMEOUT = float(os.getenv('AI_TIMEOUT', 60))
+
+# AI处理结果缓存的有效期（秒，0表示关闭缓存）和最多保存的条目数
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL', 86400))
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', 10000))
+
+# AI请求批处理：收集相同模型和提示词的消息的时间窗口（秒，0表示关闭）和每批最多的消息数
+AI_BATCH_WINDOW = float(os.getenv('AI_BATCH_WINDOW', 0))
+AI_BATCH_MAX_SIZE = int(os.getenv('AI_BATCH_MAX_SIZE', 10))
+
+# AI执行层：每个提供者的最大并发请求数、每分钟请求数和 token 数（0表示不限制）
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', 4))
+AI_RPM = float(os.getenv('AI_RPM', 0))
+AI_TPM = float(os.getenv('AI_TPM', 0))
+# 限流和服务端错误的最大重试次数，以及包括重试在内的截止时间（秒），超过后使用备用模型
+AI_MAX_RETRIES = int(os.getenv('AI_MAX_RETRIES', 3))
+AI_DEADLINE = float(os.getenv('AI_DEADLINE', 120))
+# 模型连续失败多少次后熔断，以及熔断的冷却时间（秒）
+AI_BREAKER_THRESHOLD = int(os.getenv('AI_BREAKER_THRESHOLD', 5))
+AI_BREAKER_COOLDOWN = float(os.getenv('AI_BREAKER_COOLDOWN', 60))
+# 每个模型的延迟和错误统计的日志输出间隔（秒），0表示关闭
+AI_METRICS_INTERVAL = int(os.getenv('AI_METRICS_INTERVAL', 300))
+
 # 分页配置
 MODELS_PER_PAGE = int(os.getenv('AI_MODELS_PER_PAGE', 10))
 KEYWORDS_PER_PAGE = int(os.getenv('KEYWORDS_PER_PAGE', 50))
@@ -0,0 +1,310 @@
+import logging
+import re
+from collections import deque, OrderedDict
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 匹配结果标记
+WHITELIST_HIT = 1
+BLACKLIST_HIT = 2
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 多模式匹配自动机
+
+    每个模式附带一个整数标记，search 返回文本中所有命中模式标记的按位或，
+    只需扫描一遍文本即可得到全部模式的匹配情况
+    """
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [0]
+        self._built = True
+
+    def add(self, pattern, mask):
+        """添加一个模式，空字符串模式匹配任意文本"""
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+            node = next_node
+        self._output[node] |= mask
+        self._built = False
+
+    def build(self):
+        """计算失败指针，并把失败链上的输出合并到每个节点"""
+        goto, fail, output = self._goto, self._fail, self._output
+        queue = deque()
+        for child in goto[0].values():
+            fail[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            output[node] |= output[fail[node]]
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                queue.append(child)
+        self._built = True
+
+    def search(self, text, stop_mask=0):
+        """
+        扫描文本，返回命中模式标记的按位或
+
+        Args:
+            text: 待扫描文本
+            stop_mask: 当结果已包含这些标记时提前结束扫描，0 表示扫描全文
+
+        Returns:
+            int: 命中标记
+        """
+        if not self._built:
+            self.build()
+
+        goto, fail, output = self._goto, self._fail, self._output
+        result = output[0]
+        if stop_mask and result & stop_mask == stop_mask:
+            return result
+
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            hits = output[node]
+            if hits:
+                result |= hits
+                if stop_mask and result & stop_mask == stop_mask:
+                    break
+        return result
+
+
+class KeywordMatcher:
+    """
+    单条规则编译后的关键字匹配器
+
+    普通关键字不区分大小写（与 keyword.lower() in text.lower() 等价），
+    使用 Aho-Corasick 自动机一次扫描完成；正则关键字预先编译，
+    无效的正则在编译时记录并忽略
+    """
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords: (keyword, is_regex, is_blacklist) 三元组的可迭代对象
+        """
+        self._automaton = AhoCorasick()
+        self._regexes = []
+        self._has_plain = False
+
+        for keyword, is_regex, is_blacklist in keywords:
+            if keyword is None:
+                continue
+            mask = BLACKLIST_HIT if is_blacklist else WHITELIST_HIT
+            if is_regex:
+                try:
+                    self._regexes.append((re.compile(keyword), mask))
+                except re.error:
+                    logger.error(f"正则表达式错误: {keyword}")
+            else:
+                self._automaton.add(keyword.lower(), mask)
+                self._has_plain = True
+
+        self._automaton.build()
+
+    def match(self, text, wanted=WHITELIST_HIT | BLACKLIST_HIT):
+        """
+        返回文本命中的关键字类别
+
+        Args:
+            text: 待检查文本
+            wanted: 需要判断的类别标记，已确定的类别不会重复扫描
+
+        Returns:
+            int: WHITELIST_HIT / BLACKLIST_HIT 的按位或
+        """
+        hits = self._automaton.search(text.lower(), wanted) & wanted if self._has_plain else 0
+        for pattern, mask in self._regexes:
+            if hits == wanted:
+                break
+            if mask & wanted and not mask & hits and pattern.search(text):
+                hits |= mask
+        return hits
+
+
+class SourceKeywordMatcher:
+    """
+    同一源聊天下所有规则合并后的关键字匹配器
+
+    每条规则占用两个比特位（白名单命中、黑名单命中），所有规则的普通关键字
+    合并进同一个自动机，相同的正则只编译和执行一次。扫描一遍消息即可得到
+    每条规则的黑白名单命中情况，最近扫描过的文本结果会被缓存，
+    同一条消息的其他规则直接读取比特位
+    """
+
+    RECENT_TEXTS = 16
+
+    def __init__(self, rule_keywords):
+        """
+        Args:
+            rule_keywords: (规则ID, 关键字三元组序列) 的序列
+        """
+        self._shifts = {}
+        self._automaton = AhoCorasick()
+        self._has_plain = False
+        regex_masks = {}
+
+        for index, (rule_id, keywords) in enumerate(rule_keywords):
+            shift = index * 2
+            self._shifts[rule_id] = shift
+            for keyword, is_regex, is_blacklist in keywords:
+                if keyword is None:
+                    continue
+                mask = (BLACKLIST_HIT if is_blacklist else WHITELIST_HIT) << shift
+                if is_regex:
+                    regex_masks[keyword] = regex_masks.get(keyword, 0) | mask
+                else:
+                    self._automaton.add(keyword.lower(), mask)
+                    self._has_plain = True
+
+        self._regexes = []
+        for keyword, mask in regex_masks.items():
+            try:
+                self._regexes.append((re.compile(keyword), mask))
+            except re.error:
+                logger.error(f"正则表达式错误: {keyword}")
+
+        self._automaton.build()
+        self._recent = OrderedDict()
+
+    def scan(self, text):
+        """扫描文本，返回所有规则的命中比特位"""
+        hits = self._recent.get(text)
+        if hits is not None:
+            self._recent.move_to_end(text)
+            return hits
+
+        hits = self._automaton.search(text.lower()) if self._has_plain else 0
+        for pattern, mask in self._regexes:
+            if mask & ~hits and pattern.search(text):
+                hits |= mask
+
+        self._recent[text] = hits
+        if len(self._recent) > self.RECENT_TEXTS:
+            self._recent.popitem(last=False)
+        return hits
+
+    def view(self, rule_id):
+        """获取单条规则的匹配视图"""
+        return RuleKeywordView(self, self._shifts[rule_id])
+
+
+class RuleKeywordView:
+    """合并匹配器中单条规则的视图，接口与 KeywordMatcher 相同"""
+
+    def __init__(self, source_matcher, shift):
+        self._source_matcher = source_matcher
+        self._shift = shift
+
+    def match(self, text, wanted=WHITELIST_HIT | BLACKLIST_HIT):
+        return (self._source_matcher.scan(text) >> self._shift) & wanted
+
+
+# 规则ID -> (编译时的关键字, 匹配器)
+_matcher_cache: Dict[int, Tuple[tuple, KeywordMatcher]] = {}
+
+# 源聊天 -> (编译时的规则关键字, 合并匹配器)
+_source_cache: Dict[str, Tuple[tuple, SourceKeywordMatcher]] = {}
+
+# 规则ID -> (编译时的关键字, 合并匹配器中的规则视图)
+_rule_views: Dict[int, Tuple[tuple, RuleKeywordView]] = {}
+
+
+def update_source_matchers(rules_by_source):
+    """
+    按源聊天编译合并匹配器，只有关键字发生变化的源聊天会重新编译，
+    同时删除已不存在的规则的匹配器
+
+    Args:
+        rules_by_source: 源聊天 -> 规则快照序列
+    """
+    source_cache = {}
+    rule_views = {}
+    rule_ids = set()
+
+    for source, rules in rules_by_source.items():
+        rule_ids.update(rule.id for rule in rules)
+        rules = [rule for rule in rules if rule.keywords]
+        # 单条规则无需合并，直接使用规则自己的匹配器
+        if len(rules) < 2:
+            continue
+
+        signature = tuple((rule.id, rule.keywords) for rule in rules)
+        cached = _source_cache.get(source)
+        if cached and cached[0] == signature:
+            source_matcher = cached[1]
+        else:
+            source_matcher = SourceKeywordMatcher([
+                (rule.id, [(k.keyword, k.is_regex, k.is_blacklist) for k in rule.keywords])
+                for rule in rules
+            ])
+            logger.info(f"源聊天 {source} 的合并关键字匹配器已编译，共 {len(rules)} 条规则")
+
+        source_cache[source] = (signature, source_matcher)
+        for rule in rules:
+            rule_views[rule.id] = (rule.keywords, source_matcher.view(rule.id))
+
+    _source_cache.clear()
+    _source_cache.update(source_cache)
+    _rule_views.clear()
+    _rule_views.update(rule_views)
+
+    # 已删除的规则不会再被查询，其匹配器需要从缓存中移除
+    for rule_id in [rule_id for rule_id in _matcher_cache if rule_id not in rule_ids]:
+        del _matcher_cache[rule_id]
+
+
+def get_keyword_matcher(rule):
+    """
+    获取规则的关键字匹配器，仅在该规则的关键字发生变化时重新编译
+
+    源聊天有多条规则时优先返回合并匹配器中的规则视图
+
+    Args:
+        rule: 规则快照或 ForwardRule 对象
+
+    Returns:
+        KeywordMatcher | RuleKeywordView: 编译后的匹配器
+    """
+    keywords = rule.keywords
+    if isinstance(keywords, tuple):
+        # 规则快照的关键字是不可变元组，可以直接作为缓存键
+        signature = keywords
+        view = _rule_views.get(rule.id)
+        if view and (view[0] is keywords or view[0] == keywords):
+            return view[1]
+    else:
+        signature = tuple((k.keyword, k.is_regex, k.is_blacklist) for k in keywords)
+
+    cached = _matcher_cache.get(rule.id)
+    if cached and (cached[0] is signature or cached[0] == signature):
+        return cached[1]
+
+    if signature is keywords:
+        matcher = KeywordMatcher((k.keyword, k.is_regex, k.is_blacklist) for k in keywords)
+    else:
+        matcher = KeywordMatcher(signature)
+    _matcher_cache[rule.id] = (signature, matcher)
+    logger.info(f"规则 {rule.id} 的关键字匹配器已编译，共 {len(signature)} 个关键字")
+    return matcher
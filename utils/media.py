@@ -1,5 +1,9 @@
 import logging
 import os
+from collections import OrderedDict
+from telethon.tl.types import (
+    MessageMediaDocument, MessageMediaPhoto, InputMediaUploadedDocument, InputMediaUploadedPhoto
+)
 
 logger = logging.getLogger(__name__)
 
@@ -34,4 +38,77 @@ async def get_max_media_size():
     if not max_media_size_str:
         logger.error('未设置 MAX_MEDIA_SIZE 环境变量')
         raise ValueError('必须在 .env 文件中设置 MAX_MEDIA_SIZE')
-    return float(max_media_size_str) * 1024 * 1024  # 转换为字节，支持小数
\ No newline at end of file
+    return float(max_media_size_str) * 1024 * 1024  # 转换为字节，支持小数
+
+
+def get_media_key(media):
+    """获取可按引用发送的媒体标识，不支持的媒体返回 None"""
+    if getattr(media, 'ttl_seconds', None):
+        # 阅后即焚的媒体不能再次发送
+        return None
+    if isinstance(media, MessageMediaDocument) and getattr(media.document, 'access_hash', None) is not None:
+        return ('document', media.document.id)
+    if isinstance(media, MessageMediaPhoto) and getattr(media.photo, 'access_hash', None) is not None:
+        return ('photo', media.photo.id)
+    return None
+
+
+def get_uploaded_input_media(media, input_file):
+    """使用已上传的文件和原媒体的属性构建 InputMedia，保留原文件名、时长、尺寸等信息"""
+    if isinstance(media, MessageMediaPhoto):
+        return InputMediaUploadedPhoto(file=input_file)
+    document = media.document
+    return InputMediaUploadedDocument(
+        file=input_file,
+        mime_type=document.mime_type,
+        attributes=document.attributes
+    )
+
+
+class MediaReferenceCache:
+    """
+    媒体引用缓存
+
+    文件引用只对获取它的账号有效：收到消息的客户端可以直接使用原消息的媒体，
+    其他客户端（例如机器人）第一次发送后，记录发送结果中的媒体，
+    之后同一媒体发往其他目标时直接按引用发送，无需再次下载和上传
+    """
+
+    MAX_ENTRIES = 1000
+
+    def __init__(self):
+        self._references = OrderedDict()
+
+    def get(self, client, message):
+        """获取客户端可以直接发送的媒体引用，没有时返回 None"""
+        key = get_media_key(message.media)
+        if key is None:
+            return None
+        if message.client is client:
+            return message.media
+
+        cache_key = (id(client), key)
+        media = self._references.get(cache_key)
+        if media is not None:
+            self._references.move_to_end(cache_key)
+        return media
+
+    def remember(self, client, message, sent_media):
+        """记录客户端发送源消息媒体后得到的媒体引用"""
+        key = get_media_key(message.media)
+        if key is None or message.client is client or get_media_key(sent_media) is None:
+            return
+        self._references[(id(client), key)] = sent_media
+        self._references.move_to_end((id(client), key))
+        if len(self._references) > self.MAX_ENTRIES:
+            self._references.popitem(last=False)
+
+    def discard(self, client, message):
+        """删除失效的媒体引用"""
+        key = get_media_key(message.media)
+        if key is not None:
+            self._references.pop((id(client), key), None)
+
+
+# 创建全局实例
+media_references = MediaReferenceCache()
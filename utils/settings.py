@@ -6,14 +6,14 @@ from utils.file_creator import create_default_configs
 logger = logging.getLogger(__name__)
 
 def load_ai_models():
-    """加载AI模型列表"""
+    """加载AI模型列表，每行第一列为模型名称，之后可以写上提供者名称"""
     try:
         models_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', 'ai_models.txt')
         if not os.path.exists(models_path):
             create_default_configs()
             
         with open(models_path, 'r', encoding='utf-8') as f:
-            models = [line.strip() for line in f if line.strip()]
+            models = [line.split()[0] for line in f if line.strip()]
             if models:
                 return models
     except (FileNotFoundError, IOError) as e:
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    令牌桶
+
+    每秒补充 rate 个令牌，最多保存 capacity 个。令牌不足时先预支，
+    调用者按预支的顺序依次等待，先到先得
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, cost=1):
+        """取出 cost 个令牌，令牌不足时等待"""
+        if self.rate <= 0:
+            return
+        cost = min(cost, self.capacity)
+        self._refill()
+        self._tokens -= cost
+        if self._tokens >= 0:
+            return
+        try:
+            await asyncio.sleep(-self._tokens / self.rate)
+        except asyncio.CancelledError:
+            # 取消等待时归还预支的令牌
+            self._tokens += cost
+            raise
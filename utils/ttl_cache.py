@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+import weakref
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# 后台清理过期条目的间隔（秒）
+SWEEP_INTERVAL = 1
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    带过期时间和容量上限的缓存
+
+    过期时间保存在按到期时间排序的堆中，读取时检查是否过期，
+    所有缓存共用一个后台任务定期清理已过期的条目，不需要为每个条目创建定时任务。
+    超过容量上限时淘汰最久未写入的条目
+    """
+
+    def __init__(self, ttl=None, maxsize=None, on_expire=None, name=None):
+        """
+        Args:
+            ttl: 默认过期时间（秒），None 表示不过期
+            maxsize: 容量上限，None 表示不限制
+            on_expire: 条目过期时调用的函数，参数为 (key, value)
+            name: 缓存名称，用于日志
+        """
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.name = name or self.__class__.__name__
+        self._on_expire = on_expire
+        # key -> (value, 到期时间)
+        self._data = OrderedDict()
+        # (到期时间, 序号, key)，条目被覆盖或删除后旧的堆元素在弹出时跳过
+        self._heap = []
+        self._counter = itertools.count()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def set(self, key, value, ttl=_MISSING):
+        """写入条目，ttl 未指定时使用默认过期时间"""
+        ttl = self.ttl if ttl is _MISSING else ttl
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        if expires_at is not None:
+            heapq.heappush(self._heap, (expires_at, next(self._counter), key))
+            _sweeper.register(self)
+
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+        # 旧的堆元素过多时重建堆
+        if len(self._heap) > 2 * len(self._data) + 64:
+            self._rebuild_heap()
+
+    def add(self, key, ttl=_MISSING):
+        """作为集合使用时添加元素"""
+        self.set(key, True, ttl)
+
+    def get(self, key, default=None):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.monotonic():
+            self._expire_key(key)
+            item = None
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return item[0]
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def pop(self, key, default=None):
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if item[1] is not None and item[1] <= time.monotonic():
+            # 已过期的条目与 get 一样按过期处理
+            self._expire_key(key)
+            return default
+        del self._data[key]
+        return item[0]
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def __len__(self):
+        self.sweep()
+        return len(self._data)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def items(self):
+        self.sweep()
+        return [(key, value) for key, (value, _) in self._data.items()]
+
+    def sweep(self, now=None):
+        """删除所有已过期的条目"""
+        now = time.monotonic() if now is None else now
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires_at, _, key = heapq.heappop(heap)
+            item = self._data.get(key)
+            # 条目已被删除或以新的过期时间重新写入
+            if item is None or item[1] != expires_at:
+                continue
+            self._expire_key(key)
+
+    def _expire_key(self, key):
+        value, _ = self._data.pop(key)
+        self.expirations += 1
+        if self._on_expire:
+            try:
+                self._on_expire(key, value)
+            except Exception as e:
+                logger.error(f'{self.name} 处理过期条目时出错: {str(e)}')
+
+    def _rebuild_heap(self):
+        self._heap = [
+            (expires_at, next(self._counter), key)
+            for key, (_, expires_at) in self._data.items() if expires_at is not None
+        ]
+        heapq.heapify(self._heap)
+
+    def stats(self):
+        """获取缓存统计"""
+        return {
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+        }
+
+
+class _Sweeper:
+    """定期清理所有 TTLCache 中已过期条目的后台任务"""
+
+    def __init__(self):
+        self._caches = weakref.WeakSet()
+        self._task = None
+
+    def register(self, cache):
+        self._caches.add(cache)
+        if self._task is None or self._task.done():
+            try:
+                self._task = asyncio.get_running_loop().create_task(self._run())
+            except RuntimeError:
+                # 没有运行中的事件循环时只在读取时检查过期
+                self._task = None
+
+    async def _run(self):
+        while self._caches:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            now = time.monotonic()
+            for cache in list(self._caches):
+                cache.sweep(now)
+
+
+_sweeper = _Sweeper()